@@ -0,0 +1,135 @@
+"""Headless preprocessing: decompress, convert and pre-parse .lz4 models into the model cache.
+
+Run from the folder that contains the addon, e.g.
+
+    python -m hades2_blender_utility path/to/models --workers 8 --manifest manifest.json
+
+Progress is written to the manifest as files finish, so an interrupted run
+picks up where it stopped. Only the bpy-free modules are imported.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from .model_loader import preprocess_hades_models
+from .model_cache import model_cache
+from .scratch import scratch_workspace, SCRATCH_DIR_ENV
+
+MANIFEST_VERSION = 1
+MANIFEST_SAVE_INTERVAL = 2.0
+
+
+def find_lz4_files(inputs):
+    lz4_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                lz4_paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(".lz4"))
+        elif os.path.isfile(path):
+            lz4_paths.append(path)
+        else:
+            print(f"Skipping missing input: {path}")
+    return sorted(set(os.path.abspath(path) for path in lz4_paths))
+
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {'version': MANIFEST_VERSION, 'files': {}}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'files': {}}
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    manifest_dir = os.path.dirname(manifest_path)
+    if manifest_dir:
+        os.makedirs(manifest_dir, exist_ok=True)
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def is_done(entry, lz4_path):
+    """A file is done when it last succeeded, has not changed since and its cache entry still exists"""
+    if not entry or entry.get('status') != 'ok':
+        return False
+    stat = os.stat(lz4_path)
+    if entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime:
+        return False
+    return os.path.isfile(model_cache.path(entry.get('cache_key', '')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m " + (__package__ or "hades2_blender_utility"), description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help=".lz4 files or folders searched recursively")
+    parser.add_argument("--manifest", default="hades2_manifest.json", help="JSON results manifest, also used to resume")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="files processed in parallel")
+    parser.add_argument("--threads", action="store_true", help="use a thread pool instead of processes")
+    parser.add_argument("--parse-workers", type=int, default=1, help="threads parsing the meshes of one file")
+    parser.add_argument("--batch-size", type=int, default=16, help="most files converted by one Divine run")
+    parser.add_argument("--force", action="store_true", help="redo files the manifest already lists as done")
+    args = parser.parse_args(argv)
+
+    lz4_paths = find_lz4_files(args.inputs)
+    manifest = load_manifest(args.manifest)
+    files = manifest['files']
+    pending = [path for path in lz4_paths if args.force or not is_done(files.get(path), path)]
+    print(f"{len(lz4_paths)} files, {len(lz4_paths) - len(pending)} already done, {len(pending)} to process")
+    print(f"Model cache: {model_cache.cache_dir}")
+
+    start_time = time.perf_counter()
+    last_save = start_time
+    failed = 0
+    pool_type = ThreadPoolExecutor if args.threads else ProcessPoolExecutor
+    if pool_type is ProcessPoolExecutor:
+        #worker processes exit without running atexit, so keep their scratch folders inside ours
+        os.environ[SCRATCH_DIR_ENV] = scratch_workspace.session_dir()
+    #each worker converts a batch of files with one Divine run, batches shrink so every worker gets one
+    workers = max(1, args.workers)
+    batch_size = max(1, min(args.batch_size, -(-len(pending) // workers)))
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    with pool_type(max_workers=workers) as pool:
+        #stat before reading so a file edited mid-run is picked up again next time
+        stats = {path: os.stat(path) for path in pending}
+        futures = {
+            pool.submit(preprocess_hades_models, batch, args.parse_workers): batch for batch in batches
+        }
+        done_count = 0
+        try:
+            for future in as_completed(futures):
+                for path, record in zip(futures[future], future.result()):
+                    done_count += 1
+                    record['size'] = stats[path].st_size
+                    record['mtime'] = stats[path].st_mtime
+                    files[path] = record
+
+                    if record['status'] != 'ok':
+                        failed += 1
+                        print(f"[{done_count}/{len(pending)}] {path} failed: {record['error']}")
+                    else:
+                        print(f"[{done_count}/{len(pending)}] {path} {record['seconds']:.2f}s")
+
+                if time.perf_counter() - last_save >= MANIFEST_SAVE_INTERVAL:
+                    save_manifest(args.manifest, manifest)
+                    last_save = time.perf_counter()
+        except KeyboardInterrupt:
+            #files already running still finish, queued ones are dropped
+            print("Interrupted, saving progress.")
+            pool.shutdown(wait=False, cancel_futures=True)
+            save_manifest(args.manifest, manifest)
+            return 130
+
+    save_manifest(args.manifest, manifest)
+    elapsed = time.perf_counter() - start_time
+    print(f"Processed {len(pending)} files in {elapsed:.2f}s, {failed} failed. Manifest: {args.manifest}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import numpy as np
+
+
+def sample_pose_matrices(scene, armature, frames):
+    """Armature-space pose matrices of every pose bone, shaped (frames, bones, 4, 4)"""
+    pose_bones = armature.pose.bones
+    samples = np.empty((len(frames), len(pose_bones), 16), dtype=np.float32)
+
+    frame_current, subframe = scene.frame_current, scene.frame_subframe
+    try:
+        for i, frame in enumerate(frames):
+            scene.frame_set(frame)
+            pose_bones.foreach_get("matrix", samples[i].ravel())
+    finally:
+        scene.frame_set(frame_current, subframe=subframe)
+
+    # foreach_get flattens matrices column by column
+    return samples.reshape(len(frames), len(pose_bones), 4, 4).transpose(0, 1, 3, 2)
+
+
+def rest_matrices(armature):
+    """Armature-space rest matrices, in pose bone order"""
+    pose_bones = armature.pose.bones
+    rest = np.array([pose_bone.bone.matrix_local for pose_bone in pose_bones], dtype=np.float64)
+    return rest.reshape(len(pose_bones), 4, 4)
+
+
+def bone_hierarchy(armature):
+    """Pose bone names in hierarchy order with each bone's parent index, -1 for roots"""
+    pose_bones = armature.pose.bones
+    order = []
+
+    def visit(pose_bone):
+        order.append(pose_bone)
+        for child in pose_bone.children:
+            visit(child)
+
+    for pose_bone in pose_bones:
+        if pose_bone.parent is None:
+            visit(pose_bone)
+
+    position = {pose_bone.name: i for i, pose_bone in enumerate(order)}
+    parents = np.array(
+        [position[pose_bone.parent.name] if pose_bone.parent else -1 for pose_bone in order], dtype=np.int64
+    )
+    bone_index = {pose_bone.name: i for i, pose_bone in enumerate(pose_bones)}
+    source_order = np.array([bone_index[pose_bone.name] for pose_bone in order], dtype=np.int64)
+    return [pose_bone.name for pose_bone in order], parents, source_order
+
+
+def parent_relative(matrices, parents):
+    """Turn armature-space matrices (..., bones, 4, 4) into matrices relative to each bone's parent"""
+    local = np.array(matrices, dtype=np.float64)
+    has_parent = parents >= 0
+    if has_parent.any():
+        parent_inverse = np.linalg.inv(local[..., parents[has_parent], :, :])
+        local[..., has_parent, :, :] = parent_inverse @ local[..., has_parent, :, :]
+    return local
+
+
+def sample_armature_animation(scene, armature, frame_start, frame_end):
+    """Sample every frame in the range, returning (bone names, parents, local rest, times, local poses)"""
+    frames = list(range(frame_start, frame_end + 1))
+    names, parents, source_order = bone_hierarchy(armature)
+
+    rest = rest_matrices(armature)[source_order]
+    poses = sample_pose_matrices(scene, armature, frames)[:, source_order]
+
+    fps = scene.render.fps / scene.render.fps_base
+    times = np.array(frames, dtype=np.float64) / fps
+    return names, parents, parent_relative(rest, parents), times, parent_relative(poses, parents)
+
+
+def action_fingerprint(armature, action, frame_start, frame_end, settings):
+    """Hash everything the batch export of one action depends on.
+
+    Covers the action's fcurves, the frame range, the armature's rest pose
+    and transform, and the export settings, which include the scene frame
+    rate. Drivers, constraints and other objects are not part of it.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([frame_start, frame_end, settings], sort_keys=True).encode())
+
+    bones = armature.data.bones
+    rest = np.empty(len(bones) * 16, dtype=np.float32)
+    bones.foreach_get("matrix_local", rest)
+    digest.update(json.dumps([[bone.name, bone.parent.name if bone.parent else None] for bone in bones]).encode())
+    digest.update(rest.tobytes())
+    digest.update(np.array(armature.matrix_world, dtype=np.float32).tobytes())
+
+    for fcurve in sorted(action.fcurves, key=lambda fcurve: (fcurve.data_path, fcurve.array_index)):
+        keyframes = fcurve.keyframe_points
+        digest.update(json.dumps([
+            fcurve.data_path,
+            fcurve.array_index,
+            fcurve.extrapolation,
+            fcurve.mute,
+            [modifier.type for modifier in fcurve.modifiers],
+            [(keyframe.interpolation, keyframe.easing) for keyframe in keyframes],
+        ]).encode())
+        for attribute in ("co", "handle_left", "handle_right"):
+            values = np.empty(len(keyframes) * 2, dtype=np.float32)
+            keyframes.foreach_get(attribute, values)
+            digest.update(values.tobytes())
+
+    return digest.hexdigest()
@@ -0,0 +1,197 @@
+"""Benchmark read_collada on a multi-geometry model with one or more parse workers.
+
+Run from the addon folder:
+
+    python benchmarks/collada_benchmark.py                   # compare 1, 2 and 4 workers
+    python benchmarks/collada_benchmark.py --workers 1 8     # pick the worker counts
+    python benchmarks/collada_benchmark.py --skip-benchmark  # only check the results match
+
+The script exits non-zero when a worker count reads the fixture differently
+from a single worker.
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# The addon folder is the package, load it under a fixed name so its relative imports work
+PACKAGE_NAME = "hades2_blender_utility"
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if PACKAGE_NAME not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(ADDON_DIR, "__init__.py"), submodule_search_locations=[ADDON_DIR]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+
+from hades2_blender_utility.collada_reader import read_collada, COLLADA_NAMESPACE
+
+DEFAULT_WORKERS = [1, 2, 4]
+
+
+# A synthetic model shaped like a converted GR2: several skinned meshes and a joint hierarchy
+
+def float_text(count, rng, low=-1.0, high=1.0):
+    return " ".join(f"{rng.uniform(low, high):.6f}" for _ in range(count))
+
+def geometry_xml(geometry_id, position_count, triangle_count, rng):
+    normal_count = position_count // 2 + 1
+    uv_count = position_count // 3 + 1
+
+    # Corners mostly reuse their position's normal and uv, like a smooth mesh with a few seams
+    indices = []
+    for _ in range(triangle_count * 3):
+        position = rng.randrange(position_count)
+        normal = position // 2 if rng.random() < 0.8 else rng.randrange(normal_count)
+        uv = position // 3 if rng.random() < 0.8 else rng.randrange(uv_count)
+        indices += [position, normal, uv]
+
+    return (
+        f'<geometry id="{geometry_id}" name="{geometry_id}Mesh"><mesh>'
+        f'<source id="{geometry_id}-positions"><float_array id="{geometry_id}-positions-array" count="{position_count * 3}">'
+        f'{float_text(position_count * 3, rng)}</float_array></source>'
+        f'<source id="{geometry_id}-normals"><float_array id="{geometry_id}-normals-array" count="{normal_count * 3}">'
+        f'{float_text(normal_count * 3, rng)}</float_array></source>'
+        f'<source id="{geometry_id}-uvs"><float_array id="{geometry_id}-uvs-array" count="{uv_count * 2}">'
+        f'{float_text(uv_count * 2, rng, 0.0)}</float_array></source>'
+        f'<vertices id="{geometry_id}-vertices"><input semantic="POSITION" source="#{geometry_id}-positions"/></vertices>'
+        f'<triangles count="{triangle_count}">'
+        f'<input semantic="VERTEX" source="#{geometry_id}-vertices" offset="0"/>'
+        f'<input semantic="NORMAL" source="#{geometry_id}-normals" offset="1"/>'
+        f'<input semantic="TEXCOORD" source="#{geometry_id}-uvs" offset="2" set="0"/>'
+        f'<p>{" ".join(map(str, indices))}</p></triangles></mesh></geometry>\n'
+    )
+
+def controller_xml(geometry_id, position_count, joint_names, rng):
+    vcount = []
+    v = []
+    weights = []
+    for _ in range(position_count):
+        influences = rng.randint(1, 4)
+        vcount.append(influences)
+        for _ in range(influences):
+            v += [rng.randrange(len(joint_names)), len(weights)]
+            weights.append(rng.random())
+
+    return (
+        f'<controller id="{geometry_id}-skin"><skin source="#{geometry_id}">'
+        f'<source id="{geometry_id}-joints"><Name_array id="{geometry_id}-joints-array" count="{len(joint_names)}">'
+        f'{" ".join(joint_names)}</Name_array></source>'
+        f'<source id="{geometry_id}-weights"><float_array id="{geometry_id}-weights-array" count="{len(weights)}">'
+        f'{" ".join(f"{weight:.6f}" for weight in weights)}</float_array></source>'
+        f'<joints><input semantic="JOINT" source="#{geometry_id}-joints"/></joints>'
+        f'<vertex_weights count="{position_count}">'
+        f'<input semantic="JOINT" source="#{geometry_id}-joints" offset="0"/>'
+        f'<input semantic="WEIGHT" source="#{geometry_id}-weights" offset="1"/>'
+        f'<vcount>{" ".join(map(str, vcount))}</vcount><v>{" ".join(map(str, v))}</v>'
+        f'</vertex_weights></skin></controller>\n'
+    )
+
+def joint_xml(joint, children, joint_names, rng):
+    matrix = [1, 0, 0, rng.uniform(-1, 1), 0, 1, 0, rng.uniform(-1, 1), 0, 0, 1, rng.uniform(-1, 1), 0, 0, 0, 1]
+    nested = "".join(joint_xml(child, children, joint_names, rng) for child in children.get(joint, []))
+    name = joint_names[joint]
+    return (
+        f'<node id="{name}" name="{name}" sid="{name}" type="JOINT">'
+        f'<matrix sid="transform">{" ".join(map(str, matrix))}</matrix>{nested}</node>'
+    )
+
+def make_model(geometry_count, position_count, triangle_count, joint_count, seed):
+    rng = random.Random(seed)
+    joint_names = [f"Bone{joint}" for joint in range(joint_count)]
+    children = {}
+    for joint in range(1, joint_count):
+        children.setdefault(rng.randrange(joint), []).append(joint)
+
+    geometry_ids = [f"Geometry{geometry}" for geometry in range(geometry_count)]
+    parts = [f'<?xml version="1.0" encoding="utf-8"?>\n<COLLADA xmlns="{COLLADA_NAMESPACE}" version="1.4.1">\n']
+    parts.append("<library_geometries>\n")
+    parts += [geometry_xml(geometry_id, position_count, triangle_count, rng) for geometry_id in geometry_ids]
+    parts.append("</library_geometries>\n<library_controllers>\n")
+    parts += [controller_xml(geometry_id, position_count, joint_names, rng) for geometry_id in geometry_ids]
+    parts.append('</library_controllers>\n<library_visual_scenes><visual_scene id="Scene">')
+    parts.append(joint_xml(0, children, joint_names, rng))
+    parts.append("</visual_scene></library_visual_scenes>\n</COLLADA>\n")
+    return "".join(parts).encode()
+
+
+def models_match(expected, actual):
+    if expected.joints != actual.joints or expected.has_visual_scene != actual.has_visual_scene:
+        return False
+    if [geometry_id for geometry_id, _ in expected.geometries] != [geometry_id for geometry_id, _ in actual.geometries]:
+        return False
+    for (_, expected_mesh), (_, actual_mesh) in zip(expected.geometries, actual.geometries):
+        if expected_mesh[0] != actual_mesh[0]:
+            return False
+        expected_arrays = list(expected_mesh[1:5]) + list(expected_mesh[5])
+        actual_arrays = list(actual_mesh[1:5]) + list(actual_mesh[5])
+        if not all(np.array_equal(a, b) for a, b in zip(expected_arrays, actual_arrays)):
+            return False
+    if expected.controllers.keys() != actual.controllers.keys():
+        return False
+    for geometry_id, expected_skin in expected.controllers.items():
+        actual_skin = actual.controllers[geometry_id]
+        if expected_skin.joint_names != actual_skin.joint_names:
+            return False
+        for name in ('offsets', 'joints', 'weights'):
+            if not np.array_equal(getattr(expected_skin, name), getattr(actual_skin, name)):
+                return False
+    return True
+
+def measure(function, repeat):
+    # Keep the fastest run
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark read_collada with several parse worker counts.")
+    parser.add_argument('--workers', type=int, nargs='+', default=DEFAULT_WORKERS, help="Worker counts to compare")
+    parser.add_argument('--geometries', type=int, default=12, help="Meshes in the fixture")
+    parser.add_argument('--positions', type=int, default=4000, help="Positions per mesh")
+    parser.add_argument('--triangles', type=int, default=8000, help="Triangles per mesh")
+    parser.add_argument('--joints', type=int, default=64, help="Joints in the skeleton")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the fastest is kept")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--skip-benchmark', action='store_true', help="Only check every worker count reads the same model")
+    args = parser.parse_args(argv)
+
+    dae_data = make_model(args.geometries, args.positions, args.triangles, args.joints, args.seed)
+    print(f"Fixture: {args.geometries} meshes of {args.triangles} triangles, "
+          f"{args.joints} joints, {len(dae_data) / (1024 * 1024):.1f} MB")
+
+    expected = read_collada(dae_data)
+    failures = [workers for workers in args.workers if not models_match(expected, read_collada(dae_data, workers))]
+    for workers in failures:
+        print(f"FAIL {workers} workers read a different model than 1 worker")
+    print(f"Correctness: {'failed' if failures else 'passed'}")
+    if failures:
+        return 1
+
+    if args.skip_benchmark:
+        return 0
+
+    single = None
+    for workers in args.workers:
+        seconds = measure(lambda: read_collada(dae_data, workers), args.repeat)
+        single = single or (seconds if workers == 1 else None)
+        speedup = f"   speedup {single / seconds:5.2f}x" if single else ""
+        print(f"{workers:3} workers {seconds * 1000:9.1f} ms{speedup}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
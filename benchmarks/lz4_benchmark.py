@@ -0,0 +1,257 @@
+"""Benchmark and round-trip regression checks for lz4_handler.
+
+Run from the addon folder:
+
+    python benchmarks/lz4_benchmark.py                  # report throughput and ratio
+    python benchmarks/lz4_benchmark.py --save-baseline  # store this machine's numbers
+    python benchmarks/lz4_benchmark.py --check          # fail if throughput regressed
+
+The script exits non-zero when a correctness check fails, or when --check
+finds a result slower than the stored baseline by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lz4_handler
+
+DEFAULT_SIZES = [64 * 1024, 1024 * 1024]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lz4_baseline.json")
+
+
+# Synthetic corpora resembling the sections of a GR2 file
+
+def float_table(size, rng):
+    # Vertex/animation style data: rows of floats with many repeated components
+    values = [0.0, 1.0, -1.0, 0.5] + [rng.uniform(-1.0, 1.0) for _ in range(60)]
+    row = struct.Struct('<8f')
+    out = bytearray()
+    while len(out) < size:
+        out += row.pack(*(rng.choice(values) for _ in range(8)))
+    return bytes(out[:size])
+
+def string_section(size, rng):
+    # Bone, mesh and material names separated by NULs
+    words = ["Armature", "Bone", "Spine", "Head", "Arm", "Leg", "Mesh", "Material",
+             "_L", "_R", "Root", "Hand", "Finger", "Cloth", "Hair", "Weapon"]
+    out = bytearray()
+    while len(out) < size:
+        out += "".join(rng.choice(words) for _ in range(rng.randint(1, 4))).encode() + b"\x00"
+        out += struct.pack('<I', rng.randint(0, 4096))
+    return bytes(out[:size])
+
+def short_matches(size, rng):
+    # Matches of 4 to 8 bytes between short literal runs, where per-sequence overhead dominates decoding
+    words = [rng.randbytes(rng.randint(4, 8)) for _ in range(256)]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words)
+        out += rng.randbytes(rng.randint(0, 3))
+    return bytes(out[:size])
+
+def random_noise(size, rng):
+    return rng.randbytes(size)
+
+def mixed(size, rng):
+    out = bytearray()
+    generators = [float_table, string_section, random_noise]
+    while len(out) < size:
+        out += rng.choice(generators)(rng.randint(256, 16384), rng)
+    return bytes(out[:size])
+
+CORPORA = {
+    'floats': float_table,
+    'strings': string_section,
+    'short_matches': short_matches,
+    'noise': random_noise,
+    'mixed': mixed,
+}
+
+
+def available_backends():
+    return [name for name in lz4_handler.BACKENDS if name != 'native' or lz4_handler.lz4_block is not None]
+
+def check_block_rules(block, data_length):
+    # Walk the sequences and check the end-of-block rules from the LZ4 spec
+    pos = 0
+    out = 0
+    last_match_start = -1
+    last_literals = 0
+    while pos < len(block):
+        token = block[pos]
+        pos += 1
+        literal_length = token >> 4
+        if literal_length == 15:
+            extra_length, pos = lz4_handler.decode_extended_value(block, pos)
+            literal_length += extra_length
+        pos += literal_length
+        out += literal_length
+        last_literals = literal_length
+        if pos >= len(block):
+            break
+        offset = block[pos] | (block[pos + 1] << 8)
+        pos += 2
+        if offset == 0 or offset > out:
+            return f"invalid offset {offset} at output position {out}"
+        match_length = (token & 0xF) + 4
+        if match_length == 19:
+            extra_length, pos = lz4_handler.decode_extended_value(block, pos)
+            match_length += extra_length
+        last_match_start = out
+        out += match_length
+
+    if out != data_length:
+        return f"block decodes to {out} bytes, expected {data_length}"
+    if last_match_start != -1:
+        if last_literals < lz4_handler.LAST_LITERALS:
+            return f"only {last_literals} trailing literals"
+        if last_match_start > data_length - lz4_handler.MF_LIMIT:
+            return f"last match starts {data_length - last_match_start} bytes from the end"
+    return None
+
+def round_trip(data, label, failures):
+    for encoder in available_backends():
+        for level in lz4_handler.COMPRESSION_LEVELS:
+            lz4_handler.set_backend(encoder)
+            block = bytes(lz4_handler.compress_lz4_data(data, level))
+
+            problem = check_block_rules(block, len(data))
+            if problem:
+                failures.append(f"{label} {encoder}/{level}: {problem}")
+
+            for decoder in available_backends():
+                lz4_handler.set_backend(decoder)
+                if bytes(lz4_handler.decompress_lz4_data(block)) != data:
+                    failures.append(f"{label}: {encoder}/{level} block did not round-trip through {decoder}")
+
+def run_correctness(seed, fuzz_cases):
+    rng = random.Random(seed)
+    failures = []
+
+    # Sizes around the small-input shortcut and the end-of-block limits
+    for size in list(range(0, 40)) + [64, 255, 256, 270, 65535, 65536, 70000]:
+        for name, generator in CORPORA.items():
+            round_trip(generator(size, rng), f"{name}[{size}]", failures)
+
+    # Long runs exercise extended lengths and overlapping matches
+    for size in [15, 19, 270, 66000]:
+        round_trip(bytes(size), f"zeros[{size}]", failures)
+        round_trip(b"ab" * size, f"pattern[{size * 2}]", failures)
+
+    for case in range(fuzz_cases):
+        size = rng.choice([rng.randint(0, 64), rng.randint(0, 4096), rng.randint(0, 200000)])
+        data = rng.choice(list(CORPORA.values()))(size, rng)
+        round_trip(data, f"fuzz#{case}[{size}]", failures)
+
+    return failures
+
+def measure(function, repeat, min_time=0.2):
+    # Keep the fastest run, repeating short operations until timings settle
+    best = None
+    result = None
+    runs = 0
+    total = 0.0
+    while runs < repeat or total < min_time:
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        runs += 1
+        total += elapsed
+    return best, result
+
+def run_benchmarks(sizes, repeat, seed):
+    results = {}
+    for corpus, generator in CORPORA.items():
+        for size in sizes:
+            data = generator(size, random.Random(seed))
+            megabytes = len(data) / (1024 * 1024)
+            for backend in available_backends():
+                lz4_handler.set_backend(backend)
+                for level in lz4_handler.COMPRESSION_LEVELS:
+                    compress_time, block = measure(lambda: lz4_handler.compress_lz4_data(data, level), repeat)
+                    decompress_time, _ = measure(lambda: lz4_handler.decompress_lz4_data(block, len(data)), repeat)
+                    key = f"{backend}/{level}/{corpus}/{size}"
+                    results[key] = {
+                        'compress_mb_s': megabytes / compress_time,
+                        'decompress_mb_s': megabytes / decompress_time,
+                        'ratio': len(data) / max(len(block), 1),
+                    }
+                    print(f"{key:40} compress {results[key]['compress_mb_s']:9.2f} MB/s   "
+                          f"decompress {results[key]['decompress_mb_s']:9.2f} MB/s   "
+                          f"ratio {results[key]['ratio']:6.3f}")
+    return results
+
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for metric in ('compress_mb_s', 'decompress_mb_s'):
+            if current[metric] < previous[metric] * (1.0 - tolerance):
+                regressions.append(f"{key} {metric}: {current[metric]:.2f} < baseline {previous[metric]:.2f}")
+        if current['ratio'] < previous['ratio'] * (1.0 - tolerance):
+            regressions.append(f"{key} ratio: {current['ratio']:.3f} < baseline {previous['ratio']:.3f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LZ4 codec in lz4_handler.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Corpus sizes in bytes")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the fastest is kept")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--fuzz', type=int, default=200, help="Number of random round-trip cases")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--check', action='store_true', help="Fail if throughput regressed past the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown as a fraction")
+    parser.add_argument('--skip-benchmark', action='store_true', help="Only run the correctness checks")
+    args = parser.parse_args(argv)
+
+    initial_backend = lz4_handler.get_backend()
+    print(f"Backends: {', '.join(available_backends())} (default: {initial_backend})")
+
+    failures = run_correctness(args.seed, args.fuzz)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"Correctness: {'failed' if failures else 'passed'}")
+    if failures:
+        return 1
+
+    if args.skip_benchmark:
+        return 0
+
+    results = run_benchmarks(args.sizes, args.repeat, args.seed)
+    lz4_handler.set_backend(initial_backend)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.isfile(args.baseline):
+            print(f"No baseline at {args.baseline}, run with --save-baseline first.")
+            return 1
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
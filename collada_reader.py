@@ -0,0 +1,370 @@
+import io
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+from .skin_weights import SkinWeights
+
+COLLADA_NAMESPACE = 'http://www.collada.org/2005/11/COLLADASchema'
+
+
+class ColladaModel:
+    """Everything the importers need from a DAE, gathered in one pass"""
+
+    def __init__(self):
+        # (name, parent index or -1, 16 row-major floats or None) in hierarchy order
+        self.joints = []
+        # (geometry id, parse_geometry result)
+        self.geometries = []
+        # geometry id -> SkinWeights
+        self.controllers = {}
+        self.has_visual_scene = False
+
+
+class ColladaIndex:
+    """Id lookups for sources and their arrays, filled in as elements close"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.source_tag = f"{{{namespace['c']}}}source"
+        self.elements = {}
+        self.float_arrays = {}
+        self.name_arrays = {}
+
+    @staticmethod
+    def ref_id(ref):
+        # COLLADA references point at ids as '#id'
+        return ref[1:] if ref.startswith('#') else ref
+
+    def add(self, elem):
+        elem_id = elem.get('id')
+        if elem_id is None:
+            return
+        self.elements[elem_id] = elem
+
+        if elem.tag == self.source_tag:
+            float_array = elem.find('c:float_array', self.namespace)
+            if float_array is not None:
+                self.float_arrays[elem_id] = float_array
+            name_array = elem.find('c:Name_array', self.namespace)
+            if name_array is not None:
+                self.name_arrays[elem_id] = name_array
+
+    def forget(self, elem):
+        for child in elem.iter():
+            elem_id = child.get('id')
+            if elem_id is not None:
+                self.elements.pop(elem_id, None)
+                self.float_arrays.pop(elem_id, None)
+                self.name_arrays.pop(elem_id, None)
+
+    def resolve(self, ref):
+        return self.elements.get(self.ref_id(ref))
+
+    def float_array(self, ref):
+        return self.float_arrays.get(self.ref_id(ref))
+
+    def name_array(self, ref):
+        return self.name_arrays.get(self.ref_id(ref))
+
+
+def read_collada(source, workers=1):
+    """Stream a DAE file path, bytes or file object into a ColladaModel.
+
+    Geometries and controllers are parsed as soon as their element closes and
+    then dropped from the tree, so only one of them is held as XML at a time.
+    With workers > 1 geometries are parsed on a thread pool while the file is
+    still being read, with at most two per worker in flight.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    with ThreadPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as pool:
+        return stream_collada(source, pool, workers * 2)
+
+
+def stream_collada(source, pool, max_pending):
+    model = ColladaModel()
+    namespace = None
+    index = None
+    stack = []
+    pending = deque()
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if namespace is None:
+                uri = elem.tag[1:].split('}')[0] if elem.tag.startswith('{') else COLLADA_NAMESPACE
+                namespace = {'c': uri}
+                index = ColladaIndex(namespace)
+                tags = {
+                    'geometry': f'{{{uri}}}geometry',
+                    'controller': f'{{{uri}}}controller',
+                    'visual_scene': f'{{{uri}}}visual_scene',
+                }
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        parent = stack[-1] if stack else None
+        index.add(elem)
+
+        if elem.tag == tags['geometry']:
+            if pool is not None:
+                # The worker clears the element, detach it so the tree lets go of it
+                if parent is not None:
+                    parent.remove(elem)
+                pending.append(pool.submit(parse_geometry_job, elem, namespace, index))
+                while len(pending) > max_pending:
+                    collect_geometry(model, pending.popleft())
+                continue
+
+            result = parse_geometry(elem, namespace, index)
+            if result:
+                model.geometries.append((elem.get('id'), result))
+        elif elem.tag == tags['controller']:
+            skin_elem = elem.find('c:skin', namespace)
+            geom_ref = skin_elem.get('source') if skin_elem is not None else None
+            if geom_ref:
+                skin_data = parse_skin_data(skin_elem, namespace, index)
+                if skin_data:
+                    model.controllers[index.ref_id(geom_ref)] = skin_data
+        elif elem.tag == tags['visual_scene']:
+            # Only the first scene holds the skeleton
+            if not model.has_visual_scene:
+                model.has_visual_scene = True
+                parse_joints(elem, namespace, model.joints, -1)
+        elif len(stack) != 1:
+            # Everything else is kept until its library closes
+            continue
+
+        # Drop the finished element from the document
+        index.forget(elem)
+        elem.clear()
+        if parent is not None:
+            parent.remove(elem)
+
+    # Futures are collected in submission order, keeping the document's geometry order
+    while pending:
+        collect_geometry(model, pending.popleft())
+
+    return model
+
+
+def parse_geometry_job(geometry_elem, namespace, index):
+    try:
+        return geometry_elem.get('id'), parse_geometry(geometry_elem, namespace, index)
+    finally:
+        index.forget(geometry_elem)
+        geometry_elem.clear()
+
+
+def collect_geometry(model, future):
+    geom_id, result = future.result()
+    if result:
+        model.geometries.append((geom_id, result))
+
+
+def parse_joints(node, namespace, joints, parent_index):
+    for child_node in node.findall('c:node', namespace):
+        if child_node.get('type') == 'JOINT':
+            name = child_node.get('name', 'Unnamed')
+            matrix_element = child_node.find('c:matrix', namespace)
+            matrix_values = None
+            if matrix_element is not None:
+                matrix_values = list(map(float, matrix_element.text.split()))
+
+            joints.append((name, parent_index, matrix_values))
+            parse_joints(child_node, namespace, joints, len(joints) - 1)
+
+
+def parse_skin_data(skin_elem, namespace, index):
+    joints_elem = skin_elem.find('c:joints', namespace)
+    if joints_elem is None:
+        print("No <joints> in <skin>.")
+        return None
+
+    joint_input = joints_elem.find("c:input[@semantic='JOINT']", namespace)
+    if joint_input is None:
+        print("No <input semantic='JOINT'> in <joints>.")
+        return None
+    
+    joint_source_ref = joint_input.get('source')
+    if index.resolve(joint_source_ref) is None:
+        print(f"No joint source found for {joint_source_ref}")
+        return None
+    
+    name_array = index.name_array(joint_source_ref)
+    if name_array is None:
+        print("No <Name_array> in joint source.")
+        return None
+    joint_names = name_array.text.strip().split()
+
+    vw_elem = skin_elem.find('c:vertex_weights', namespace)
+    if vw_elem is None:
+        print("No <vertex_weights> in <skin>.")
+        return None
+
+    weight_input = vw_elem.find("c:input[@semantic='WEIGHT']", namespace)
+    if weight_input is None:
+        print("No <input semantic='WEIGHT'> in <vertex_weights>.")
+        return None
+    weight_source_ref = weight_input.get('source')
+
+    weight_source = index.float_array(weight_source_ref)
+    if weight_source is None:
+        print(f"No weight float_array for {weight_source_ref}")
+        return None
+    all_weights = parse_array(weight_source.text, np.float32)
+
+    vcount_elem = vw_elem.find('c:vcount', namespace)
+    v_elem = vw_elem.find('c:v', namespace)
+    if vcount_elem is None or v_elem is None:
+        print("Missing <vcount> or <v> in <vertex_weights>.")
+        return None
+
+    vcount_list = parse_array(vcount_elem.text, np.int32)
+    v_list = parse_array(v_elem.text, np.int32)
+
+    return SkinWeights.from_collada(joint_names, all_weights, vcount_list, v_list)
+
+def parse_array(text, dtype):
+    # Decode whitespace separated numbers in C rather than per item in Python
+    if not text:
+        return np.empty(0, dtype=dtype)
+    return np.fromstring(text, dtype=dtype, sep=' ')
+
+
+def get_floats_from_source(index, source_ref):
+    float_array = index.float_array(source_ref)
+    if float_array is None:
+        return np.empty(0, dtype=np.float32)
+    return parse_array(float_array.text, np.float32)
+
+
+def rows(values, width):
+    # View a flat array as (N, width), ignoring a trailing partial row
+    count = len(values) // width
+    return values[:count * width].reshape(count, width)
+
+
+def gather_rows(values, indices, default):
+    # values[indices] with negative or out-of-range indices replaced by default
+    result = np.empty((len(indices), values.shape[1]), dtype=np.float32)
+    result[:] = default
+    valid = (indices >= 0) & (indices < len(values))
+    result[valid] = values[indices[valid]]
+    return result
+
+
+def parse_geometry(geometry_elem, namespace, index):
+    mesh_elem = geometry_elem.find('c:mesh', namespace)
+    if mesh_elem is None:
+        print("No <mesh> child found under <geometry>.")
+        return None
+
+    vertices_elem = mesh_elem.find('c:vertices', namespace)
+    if vertices_elem is None:
+        print("No <vertices> element.")
+        return None
+
+    pos_input = vertices_elem.find("c:input[@semantic='POSITION']", namespace)
+    if pos_input is None:
+        print("No input semantic='POSITION' in <vertices>.")
+        return None
+    pos_source_ref = pos_input.get('source')
+    
+    triangles_elem = mesh_elem.find('c:triangles', namespace)
+    if triangles_elem is None:
+        print("No <triangles> element found.")
+        return None
+
+    normal_input = triangles_elem.find("c:input[@semantic='NORMAL']", namespace)
+    uv_input = triangles_elem.find("c:input[@semantic='TEXCOORD']", namespace)
+    if normal_input is None or uv_input is None:
+        print("Missing NORMAL or TEXCOORD inputs in <triangles>.")
+        return None
+    
+    pos_floats = get_floats_from_source(index, pos_source_ref)
+    norm_floats = get_floats_from_source(index, normal_input.get('source'))
+    uv_floats = get_floats_from_source(index, uv_input.get('source'))
+
+    positions = rows(pos_floats, 3)
+    normals   = rows(norm_floats, 3)
+    uvs       = rows(uv_floats, 2)
+    
+    p_elem = triangles_elem.find('c:p', namespace)
+    if p_elem is None:
+        print("No <p> element inside <triangles>.")
+        return None
+
+    all_indices = parse_array(p_elem.text, np.int32)
+    stride = 3
+    triangle_count = int(triangles_elem.get('count'))
+
+    expected_len = triangle_count * 3 * stride
+    if len(all_indices) != expected_len:
+        print(f"Warning: expected {expected_len} indices, found {len(all_indices)}.")
+
+    # One row of (position, normal, uv) indices per triangle corner
+    corner_count = min(triangle_count, len(all_indices) // (3 * stride)) * 3
+    corners = all_indices[:corner_count * stride].reshape(corner_count, stride)
+
+    vertex_keys, corner_verts = dedupe_corners(corners)
+    faces = corner_verts.reshape(-1, 3)
+    pos_map = build_position_map(vertex_keys[:, 0], len(positions))
+
+    vert_positions = gather_rows(positions, vertex_keys[:, 0], (0.0, 0.0, 0.0))
+    vert_normals   = gather_rows(normals,   vertex_keys[:, 1], (0.0, 0.0, 1.0))
+    vert_uvs       = gather_rows(uvs,       vertex_keys[:, 2], (0.0, 0.0))
+
+    mesh_name = geometry_elem.get('name', geometry_elem.get('id', 'Mesh'))
+    return (mesh_name, vert_positions, vert_uvs, vert_normals, faces, pos_map)
+
+
+def dedupe_corners(corners):
+    """Merge identical corners into vertices, numbered by first appearance.
+
+    Returns the (position, normal, uv) key of every vertex and the vertex
+    index of every corner.
+    """
+    if len(corners) == 0:
+        return corners.reshape(0, 3), np.empty(0, dtype=np.int32)
+
+    corners = corners.astype(np.int64)
+    sizes = corners.max(axis=0) + 1
+    if corners.min() >= 0 and float(sizes[0]) * float(sizes[1]) * float(sizes[2]) < 2.0 ** 62:
+        # Pack each corner into one integer, sorting those is far cheaper than rows
+        packed = (corners[:, 0] * sizes[1] + corners[:, 1]) * sizes[2] + corners[:, 2]
+        _, first_corner, inverse = np.unique(packed, return_index=True, return_inverse=True)
+        keys = corners[first_corner]
+    else:
+        keys, first_corner, inverse = np.unique(corners, axis=0, return_index=True, return_inverse=True)
+
+    # np.unique sorts the keys, renumber them in the order they first appear
+    order = np.argsort(first_corner, kind='stable')
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+
+    return keys[order].astype(np.int32), rank[inverse.reshape(-1)]
+
+
+def build_position_map(vert_positions, position_count):
+    """CSR map from a COLLADA position index to the vertices created from it.
+
+    The vertices of position p are vertices[offsets[p]:offsets[p + 1]], in
+    ascending order. Vertices with a negative position index belong to no
+    position, like the default position gather_rows gives them.
+    """
+    valid = vert_positions >= 0
+    valid_positions = vert_positions[valid]
+    if len(valid_positions):
+        position_count = max(position_count, int(valid_positions.max()) + 1)
+    counts = np.bincount(valid_positions, minlength=position_count)
+
+    offsets = np.zeros(position_count + 1, dtype=np.int32)
+    np.cumsum(counts, out=offsets[1:])
+    # Negative indices sort first, so the valid vertices are the tail
+    order = np.argsort(vert_positions, kind='stable')
+    vertices = order[len(order) - len(valid_positions):].astype(np.int32)
+    return offsets, vertices
\ No newline at end of file
@@ -0,0 +1,106 @@
+import re
+import xml.etree.ElementTree as ET
+import numpy as np
+from .collada_reader import COLLADA_NAMESPACE
+
+# Same id mangling as Blender's COLLADA exporter, so node and channel ids match its output
+INVALID_ID_CHARS = re.compile(r'[^A-Za-z0-9_.\-]')
+
+
+def collada_id(name):
+    collada_name = INVALID_ID_CHARS.sub('_', name)
+    if not collada_name or not (collada_name[0].isalpha() or collada_name[0] == '_'):
+        collada_name = '_' + collada_name[1:]
+    return collada_name
+
+
+def format_floats(values):
+    # float32 rounds trip through 9 significant digits
+    values = np.asarray(values, dtype=np.float32).ravel().tolist()
+    return ("%.9g " * len(values) % tuple(values)).rstrip()
+
+
+def write_animation_collada(output_file, armature_name, action_name, object_matrix, joints, times, local_poses,
+                            scene_name="Scene", key_mask=None):
+    """Write a DAE holding only an armature's joints and their sampled animation.
+
+    joints are (name, parent index or -1, 16 row-major floats) rest matrices
+    relative to the parent, parents first as in ColladaModel.joints.
+    local_poses is a (frames, joints, 4, 4) array of parent-relative pose
+    matrices sampled at times, in seconds. An optional (frames, joints)
+    key_mask keeps only the marked frames of each joint.
+    """
+    root = ET.Element('COLLADA', {'xmlns': COLLADA_NAMESPACE, 'version': '1.4.1'})
+
+    asset = ET.SubElement(root, 'asset')
+    ET.SubElement(asset, 'unit', {'name': 'meter', 'meter': '1'})
+    ET.SubElement(asset, 'up_axis').text = 'Z_UP'
+
+    armature_id = collada_id(armature_name)
+    # The armature and bone names are mangled separately, then joined
+    joint_ids = [f"{armature_id}_{collada_id(name)}" for name, _, _ in joints]
+
+    library_animations = ET.SubElement(root, 'library_animations')
+    container = ET.SubElement(
+        library_animations, 'animation', {'id': f"action_container-{armature_id}", 'name': action_name}
+    )
+    for joint_index, (name, _, _) in enumerate(joints):
+        joint_times = times
+        joint_poses = local_poses[:, joint_index]
+        if key_mask is not None:
+            joint_times = joint_times[key_mask[:, joint_index]]
+            joint_poses = joint_poses[key_mask[:, joint_index]]
+        write_matrix_animation(
+            container, f"{joint_ids[joint_index]}_pose_matrix", joint_ids[joint_index], joint_times, joint_poses,
+        )
+
+    library_visual_scenes = ET.SubElement(root, 'library_visual_scenes')
+    visual_scene = ET.SubElement(
+        library_visual_scenes, 'visual_scene', {'id': collada_id(scene_name), 'name': scene_name}
+    )
+    armature_node = ET.SubElement(
+        visual_scene, 'node', {'id': armature_id, 'name': armature_name, 'type': 'NODE'}
+    )
+    ET.SubElement(armature_node, 'matrix', {'sid': 'transform'}).text = format_floats(object_matrix)
+
+    # Joints come parents first, so every parent node exists before its children
+    joint_nodes = []
+    for (name, parent_index, matrix_values), joint_id in zip(joints, joint_ids):
+        parent_node = joint_nodes[parent_index] if parent_index >= 0 else armature_node
+        node = ET.SubElement(
+            parent_node, 'node', {'id': joint_id, 'name': name, 'sid': collada_id(name), 'type': 'JOINT'}
+        )
+        ET.SubElement(node, 'matrix', {'sid': 'transform'}).text = format_floats(matrix_values)
+        joint_nodes.append(node)
+
+    scene = ET.SubElement(root, 'scene')
+    ET.SubElement(scene, 'instance_visual_scene', {'url': f"#{collada_id(scene_name)}"})
+
+    ET.ElementTree(root).write(output_file, encoding='utf-8', xml_declaration=True)
+
+
+def write_matrix_animation(parent, anim_id, target_id, times, matrices):
+    frame_count = len(times)
+    animation = ET.SubElement(parent, 'animation', {'id': anim_id, 'name': target_id})
+
+    write_source(animation, f"{anim_id}-input", 'float_array', format_floats(times), frame_count, 1, 'TIME', 'float')
+    write_source(animation, f"{anim_id}-output", 'float_array', format_floats(matrices), frame_count, 16,
+                 'TRANSFORM', 'float4x4')
+    write_source(animation, f"{anim_id}-interpolation", 'Name_array', " ".join(["LINEAR"] * frame_count),
+                 frame_count, 1, 'INTERPOLATION', 'name')
+
+    sampler = ET.SubElement(animation, 'sampler', {'id': f"{anim_id}-sampler"})
+    for semantic, suffix in (('INPUT', 'input'), ('OUTPUT', 'output'), ('INTERPOLATION', 'interpolation')):
+        ET.SubElement(sampler, 'input', {'semantic': semantic, 'source': f"#{anim_id}-{suffix}"})
+    ET.SubElement(animation, 'channel', {'source': f"#{anim_id}-sampler", 'target': f"{target_id}/transform"})
+
+
+def write_source(parent, source_id, array_tag, text, count, stride, param_name, param_type):
+    source = ET.SubElement(parent, 'source', {'id': source_id})
+    array = ET.SubElement(source, array_tag, {'id': f"{source_id}-array", 'count': str(count * stride)})
+    array.text = text
+    technique = ET.SubElement(source, 'technique_common')
+    accessor = ET.SubElement(
+        technique, 'accessor', {'source': f"#{source_id}-array", 'count': str(count), 'stride': str(stride)}
+    )
+    ET.SubElement(accessor, 'param', {'name': param_name, 'type': param_type})
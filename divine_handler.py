@@ -1,95 +1,420 @@
-import os
-import subprocess
-
-def gr2_to_dae(input_file):
-    if not os.path.isabs(input_file):
-        print(f"Error: The input file path '{input_file}' must be an absolute path.")
-        return None
-
-    if not os.path.isfile(input_file):
-        print(f"Error: File '{input_file}' not found.")
-        return None
-    if not input_file.lower().endswith(".gr2"):
-        print(f"Error: Input file '{input_file}' is not a .gr2 file.")
-        return None
-
-    output_file = os.path.splitext(input_file)[0] + ".dae"
-
-    addon_dir = os.path.dirname(os.path.abspath(__file__))
-    divine_exe_path = os.path.join(addon_dir, "External", "lslib", "divine.exe")
-
-    if not os.path.isfile(divine_exe_path):
-        print(f"Error: Divine.exe not found at '{divine_exe_path}'.")
-        return None
-
-    command = [
-        divine_exe_path,
-        "-a", "convert-model",
-        "-g", "bg3",
-        "-s", input_file,
-        "-d", output_file
-    ]
-
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        print("Divine.exe executed successfully!")
-        print("STDOUT:")
-        print(result.stdout)
-        if os.path.isfile(output_file):
-            print(f"DAE file created: {output_file}")
-            return output_file
-        else:
-            print("DAE file was not created.")
-            return None
-    except subprocess.CalledProcessError as e:
-        print("An error occurred while running Divine.exe.")
-        print("STDOUT:")
-        print(e.stdout)
-        print("STDERR:")
-        print(e.stderr)
-        return None
-
-
-def dae_to_gr2(input_file, export_path):
-    if not os.path.isabs(input_file):
-        print(f"Error: The input file path '{input_file}' must be an absolute path.")
-        return None
-
-    if not os.path.isfile(input_file):
-        print(f"Error: File '{input_file}' not found.")
-        return None
-    
-    if not input_file.lower().endswith(".dae"):
-        print(f"Error: Input file '{input_file}' is not a .dae file.")
-        return None
-
-    output_file = os.path.splitext(export_path)[0]
-
-    addon_dir = os.path.dirname(os.path.abspath(__file__))
-    divine_exe_path = os.path.join(addon_dir, "External", "lslib", "divine.exe")
-
-    if not os.path.isfile(divine_exe_path):
-        print(f"Error: Divine.exe not found at '{divine_exe_path}'.")
-        return None
-
-    command = [
-        divine_exe_path,
-        "-a", "convert-model",
-        "-g", "bg3",
-        "-s", input_file,
-        "-d", output_file
-    ]
-
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        print("Divine.exe executed successfully!")
-        print(result.stdout)
-        if os.path.isfile(output_file):
-            print(f"GR2 file created: {output_file}")
-            return output_file
-        else:
-            print("DAE file was not created.")
-            return None
-    except subprocess.CalledProcessError as e:
-        print(e.stderr)
-        return None
\ No newline at end of file
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+from collections import namedtuple
+from .scratch import scratch_workspace
+
+DIVINE_GAME_ARGS = ["-g", "bg3"]
+CONVERT_MODEL_ARGS = ["-a", "convert-model", *DIVINE_GAME_ARGS]
+
+DEFAULT_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+# Size limit of each cache in megabytes, overrides DEFAULT_CACHE_SIZE
+CACHE_SIZE_ENV = "HADES2_CACHE_SIZE"
+
+# Rough DAE size per GR2 byte, used to decide whether a conversion fits on the RAM disk
+DAE_SIZE_FACTOR = 8
+
+
+class DaeCache:
+    """Persistent GR2 -> DAE conversion cache with LRU eviction"""
+
+    suffix = ".dae"
+    kind = "dae"
+
+    def __init__(self, cache_dir=None, max_size=None):
+        self.cache_dir = cache_dir or default_cache_dir(self.kind)
+        self.max_size = max_size if max_size is not None else default_cache_size()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, gr2_data, args=CONVERT_MODEL_ARGS):
+        digest = hashlib.sha256()
+        digest.update("\0".join(args).encode())
+        digest.update(b"\0")
+        digest.update(gr2_data)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                dae_data = file.read()
+        except OSError:
+            self.misses += 1
+            return None
+
+        # The modification time doubles as the last-used time for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return dae_data
+
+    def put(self, key, dae_data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(dae_data)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries),
+            'max_size': self.max_size,
+        }
+
+
+def default_cache_dir(kind="dae"):
+    if os.environ.get("HADES2_CACHE_DIR"):
+        return os.path.join(os.environ["HADES2_CACHE_DIR"], kind)
+    base_dir = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "hades2_blender_utility", kind)
+
+def default_cache_size():
+    size_mb = os.environ.get(CACHE_SIZE_ENV)
+    if not size_mb:
+        return DEFAULT_CACHE_SIZE
+    try:
+        return max(0, int(size_mb)) * 1024 * 1024
+    except ValueError:
+        print(f"Warning: ignoring {CACHE_SIZE_ENV}={size_mb!r}, expected a size in megabytes")
+        return DEFAULT_CACHE_SIZE
+
+dae_cache = DaeCache()
+
+ConversionResult = namedtuple('ConversionResult', ['output_file', 'error'])
+
+
+def find_divine():
+    # HADES2_DIVINE_PATH lets a different build (or a stand-in) replace the bundled Divine
+    if os.environ.get("HADES2_DIVINE_PATH"):
+        return os.environ["HADES2_DIVINE_PATH"]
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(addon_dir, "External", "lslib", "divine.exe")
+
+
+def gr2_to_dae(input_file):
+    if not os.path.isabs(input_file):
+        print(f"Error: The input file path '{input_file}' must be an absolute path.")
+        return None
+
+    if not os.path.isfile(input_file):
+        print(f"Error: File '{input_file}' not found.")
+        return None
+    if not input_file.lower().endswith(".gr2"):
+        print(f"Error: Input file '{input_file}' is not a .gr2 file.")
+        return None
+
+    output_file = os.path.splitext(input_file)[0] + ".dae"
+
+    divine_exe_path = find_divine()
+
+    if not os.path.isfile(divine_exe_path):
+        print(f"Error: Divine.exe not found at '{divine_exe_path}'.")
+        return None
+
+    command = [
+        divine_exe_path,
+        *CONVERT_MODEL_ARGS,
+        "-s", input_file,
+        "-d", output_file
+    ]
+
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        print("Divine.exe executed successfully!")
+        print("STDOUT:")
+        print(result.stdout)
+        if os.path.isfile(output_file):
+            print(f"DAE file created: {output_file}")
+            return output_file
+        else:
+            print("DAE file was not created.")
+            return None
+    except subprocess.CalledProcessError as e:
+        print("An error occurred while running Divine.exe.")
+        print("STDOUT:")
+        print(e.stdout)
+        print("STDERR:")
+        print(e.stderr)
+        return None
+
+
+def dae_to_gr2(input_file, export_path):
+    if not os.path.isabs(input_file):
+        print(f"Error: The input file path '{input_file}' must be an absolute path.")
+        return None
+
+    if not os.path.isfile(input_file):
+        print(f"Error: File '{input_file}' not found.")
+        return None
+    
+    if not input_file.lower().endswith(".dae"):
+        print(f"Error: Input file '{input_file}' is not a .dae file.")
+        return None
+
+    output_file = os.path.splitext(export_path)[0]
+
+    divine_exe_path = find_divine()
+
+    if not os.path.isfile(divine_exe_path):
+        print(f"Error: Divine.exe not found at '{divine_exe_path}'.")
+        return None
+
+    command = [
+        divine_exe_path,
+        *CONVERT_MODEL_ARGS,
+        "-s", input_file,
+        "-d", output_file
+    ]
+
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        print("Divine.exe executed successfully!")
+        print(result.stdout)
+        if os.path.isfile(output_file):
+            print(f"GR2 file created: {output_file}")
+            return output_file
+        else:
+            print("DAE file was not created.")
+            return None
+    except subprocess.CalledProcessError as e:
+        print(e.stderr)
+        return None
+
+
+def gr2_data_to_dae(gr2_data, use_cache=True):
+    cache = dae_cache if use_cache else None
+    if cache is not None:
+        cache_key = cache.key(gr2_data)
+        dae_data = cache.get(cache_key)
+        if dae_data is not None:
+            return dae_data
+
+    dae_data = convert_gr2_data(gr2_data)
+    if dae_data is not None and cache is not None:
+        try:
+            cache.put(cache_key, dae_data)
+        except OSError as e:
+            print(f"Warning: could not cache DAE: {e}")
+    return dae_data
+
+
+def convert_gr2_data(gr2_data):
+    # Divine only reads from disk, so stage the GR2 in one scratch directory
+    # and hand the DAE back as bytes
+    with scratch_workspace.stage("gr2", len(gr2_data) * DAE_SIZE_FACTOR) as scratch_dir:
+        gr2_path = os.path.join(scratch_dir, "model.gr2")
+        with open(gr2_path, 'wb') as file:
+            file.write(gr2_data)
+
+        dae_path = gr2_to_dae(gr2_path)
+        if not dae_path:
+            return None
+
+        with open(dae_path, 'rb') as file:
+            return file.read()
+
+
+def convert_models(input_files, output_format, output_dir=None):
+    """Convert many .gr2/.dae files with a single Divine invocation.
+
+    Returns a dict mapping each input file to a ConversionResult. Outputs go to
+    output_dir, or next to their input when no directory is given. An input
+    whose output path another input already claimed gets an error instead.
+    """
+    results = {}
+    output_format = output_format.lower()
+    input_format = "dae" if output_format == "gr2" else "gr2"
+
+    batch = []
+    claimed_outputs = {}
+    for input_file in input_files:
+        if input_file in results:
+            continue
+        # Inputs with the same name from different folders would write the same output
+        output_key = os.path.normcase(os.path.abspath(batch_output_path(input_file, output_format, output_dir)))
+        if not os.path.isfile(input_file):
+            results[input_file] = ConversionResult(None, f"File '{input_file}' not found.")
+        elif not input_file.lower().endswith("." + input_format):
+            results[input_file] = ConversionResult(None, f"Input file '{input_file}' is not a .{input_format} file.")
+        elif output_key in claimed_outputs:
+            results[input_file] = ConversionResult(
+                None, f"'{input_file}' would overwrite the output of '{claimed_outputs[output_key]}'."
+            )
+        else:
+            claimed_outputs[output_key] = input_file
+            results[input_file] = None
+            batch.append(input_file)
+
+    if not batch:
+        return results
+
+    divine_exe_path = find_divine()
+    if not os.path.isfile(divine_exe_path):
+        error = f"Divine.exe not found at '{divine_exe_path}'."
+        for input_file in batch:
+            results[input_file] = ConversionResult(None, error)
+        return results
+
+    # Stage the inputs under unique names, their outputs were checked for clashes above
+    size_hint = sum(os.path.getsize(input_file) for input_file in batch) * DAE_SIZE_FACTOR
+    with scratch_workspace.stage("batch", size_hint) as scratch_dir:
+        source_dir = os.path.join(scratch_dir, "source")
+        destination_dir = os.path.join(scratch_dir, "destination")
+        os.makedirs(source_dir)
+        os.makedirs(destination_dir)
+        staged = []
+        for index, input_file in enumerate(batch):
+            staged_name = f"{index:05d}.{input_format}"
+            staged_path = os.path.join(source_dir, staged_name)
+            try:
+                os.link(input_file, staged_path)
+            except OSError:
+                shutil.copyfile(input_file, staged_path)
+            staged.append((input_file, f"{index:05d}.{output_format}"))
+
+        command = [
+            divine_exe_path,
+            "-a", "convert-models",
+            *DIVINE_GAME_ARGS,
+            "-s", source_dir,
+            "-d", destination_dir,
+            "--input-format", input_format,
+            "--output-format", output_format
+        ]
+
+        try:
+            subprocess.run(command, capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            # One bad file can fail the whole batch, convert one by one to find it
+            print(f"Batch conversion failed, converting files individually: {getattr(e, 'stderr', e)}")
+            for input_file in batch:
+                results[input_file] = convert_model(input_file, output_format, output_dir)
+            return results
+
+        for input_file, staged_output in staged:
+            output_file = batch_output_path(input_file, output_format, output_dir)
+            produced = os.path.join(destination_dir, staged_output)
+            if os.path.isfile(produced):
+                shutil.move(produced, output_file)
+                results[input_file] = ConversionResult(output_file, None)
+            else:
+                results[input_file] = ConversionResult(None, f"Divine produced no output for '{input_file}'.")
+
+    return results
+
+
+def convert_model(input_file, output_format, output_dir=None):
+    output_file = batch_output_path(input_file, output_format, output_dir)
+    command = [
+        find_divine(),
+        *CONVERT_MODEL_ARGS,
+        "-s", input_file,
+        "-d", output_file
+    ]
+    try:
+        subprocess.run(command, capture_output=True, text=True, check=True)
+    except OSError as e:
+        return ConversionResult(None, str(e))
+    except subprocess.CalledProcessError as e:
+        return ConversionResult(None, e.stderr.strip() or f"Divine.exe exited with code {e.returncode}.")
+
+    if not os.path.isfile(output_file):
+        return ConversionResult(None, f"Divine produced no output for '{input_file}'.")
+    return ConversionResult(output_file, None)
+
+
+def batch_output_path(input_file, output_format, output_dir=None):
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    directory = output_dir or os.path.dirname(input_file)
+    return os.path.join(directory, f"{stem}.{output_format}")
+
+
+def gr2_data_to_dae_batch(gr2_datas, use_cache=True):
+    """Convert a list of GR2 byte strings, returning (dae_data, error) pairs in order"""
+    cache = dae_cache if use_cache else None
+    results = [None] * len(gr2_datas)
+    pending = {}
+
+    for index, gr2_data in enumerate(gr2_datas):
+        if cache is not None:
+            cache_key = cache.key(gr2_data)
+            dae_data = cache.get(cache_key)
+            if dae_data is not None:
+                results[index] = (dae_data, None)
+                continue
+        else:
+            cache_key = None
+        pending[index] = cache_key
+
+    if not pending:
+        return results
+
+    size_hint = sum(len(gr2_datas[index]) for index in pending) * DAE_SIZE_FACTOR
+    with scratch_workspace.stage("gr2_batch", size_hint) as scratch_dir:
+        gr2_paths = {}
+        for index in pending:
+            gr2_path = os.path.join(scratch_dir, f"{index:05d}.gr2")
+            with open(gr2_path, 'wb') as file:
+                file.write(gr2_datas[index])
+            gr2_paths[index] = gr2_path
+
+        conversions = convert_models(list(gr2_paths.values()), "dae", scratch_dir)
+
+        for index, cache_key in pending.items():
+            output_file, error = conversions[gr2_paths[index]]
+            if error:
+                results[index] = (None, error)
+                continue
+            with open(output_file, 'rb') as file:
+                dae_data = file.read()
+            results[index] = (dae_data, None)
+            if cache is not None:
+                try:
+                    cache.put(cache_key, dae_data)
+                except OSError as e:
+                    print(f"Warning: could not cache DAE: {e}")
+
+    return results
\ No newline at end of file
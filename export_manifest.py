@@ -0,0 +1,48 @@
+import json
+import os
+
+EXPORT_MANIFEST_NAME = "hades_export_manifest.json"
+# Bump whenever the exported files change for the same input, so old entries stop matching
+EXPORT_FORMAT_VERSION = 1
+
+
+def load_export_manifest(export_dir):
+    manifest_path = os.path.join(export_dir, EXPORT_MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {'version': EXPORT_FORMAT_VERSION, 'exports': {}}
+    if manifest.get('version') != EXPORT_FORMAT_VERSION:
+        return {'version': EXPORT_FORMAT_VERSION, 'exports': {}}
+    return manifest
+
+
+def save_export_manifest(export_dir, manifest):
+    manifest_path = os.path.join(export_dir, EXPORT_MANIFEST_NAME)
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def is_export_current(manifest, export_path, fingerprint):
+    """The output exists, is the file written last time and came from the same fingerprint"""
+    entry = manifest['exports'].get(os.path.basename(export_path))
+    if not entry or entry.get('fingerprint') != fingerprint:
+        return False
+    try:
+        stat = os.stat(export_path)
+    except OSError:
+        return False
+    return entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime
+
+
+def record_export(manifest, export_path, fingerprint, action_name):
+    stat = os.stat(export_path)
+    manifest['exports'][os.path.basename(export_path)] = {
+        'action': action_name,
+        'fingerprint': fingerprint,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+    }
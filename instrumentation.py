@@ -0,0 +1,108 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Environment overrides for the matching addon preferences
+STAGE_LOG_ENV = "HADES2_STAGE_LOG"
+TRACE_MEMORY_ENV = "HADES2_TRACE_MEMORY"
+PROFILE_DIR_ENV = "HADES2_PROFILE_DIR"
+
+
+class StageRecorder:
+    """Wall time, and optionally peak traced memory, for each named stage.
+
+    Stages are flat: entering the same name again adds to its time. Peak
+    memory comes from tracemalloc, so it covers Python and NumPy allocations
+    but not Blender's own, and is only meaningful on one thread at a time.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.timings = {}
+        self.peaks = {}
+        self.start_time = time.perf_counter()
+        self.started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        stage_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - stage_start)
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - base_memory
+                self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+    def add(self, name, seconds):
+        """Credit time spent elsewhere, such as a conversion shared by a whole batch"""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def total(self):
+        return time.perf_counter() - self.start_time
+
+    def summary(self):
+        parts = []
+        for name, seconds in self.timings.items():
+            if name in self.peaks:
+                parts.append(f"{name} {seconds:.2f}s/{self.peaks[name] / (1024 * 1024):.1f}MB")
+            else:
+                parts.append(f"{name} {seconds:.2f}s")
+        return ", ".join(parts)
+
+    def record(self, **fields):
+        stages = {}
+        for name, seconds in self.timings.items():
+            stages[name] = {'seconds': round(seconds, 6)}
+            if name in self.peaks:
+                stages[name]['peak_bytes'] = self.peaks[name]
+        return {
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            **fields,
+            'total_seconds': round(self.total(), 6),
+            'stages': stages,
+        }
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+
+def append_stage_log(log_path, record):
+    """Append one JSON record per line so several runs can share a log"""
+    log_dir = os.path.dirname(log_path)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    with open(log_path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def profiled(profile_dir, label):
+    """Run the block under cProfile and dump the stats into profile_dir, a no-op without a directory"""
+    if not profile_dir:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        profile_path = os.path.join(profile_dir, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profiler.dump_stats(profile_path)
+        print(f"Profile written to {profile_path}")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
@@ -0,0 +1,151 @@
+import numpy as np
+
+DEFAULT_LOCATION_TOLERANCE = 0.001
+DEFAULT_ROTATION_TOLERANCE = np.radians(0.1)
+DEFAULT_SCALE_TOLERANCE = 0.0001
+# Scales below this leave no usable rotation in the basis
+ZERO_SCALE = 1e-8
+
+
+def decompose_matrices(matrices):
+    """Split (..., 4, 4) row-major transforms into location, quaternion (w, x, y, z) and scale"""
+    location = matrices[..., :3, 3]
+    basis = matrices[..., :3, :3]
+    scale = np.linalg.norm(basis, axis=-2)
+    scale[..., 0] *= np.where(np.linalg.det(basis) < 0, -1.0, 1.0)
+    rotation = basis / np.where(scale == 0, 1.0, scale)[..., None, :]
+    return location, matrix_to_quaternion(rotation), scale
+
+
+def matrix_to_quaternion(rotation):
+    m = rotation
+    candidates = np.stack([
+        1 + m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2],
+        1 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2],
+        1 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2],
+        1 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2],
+    ], axis=-1)
+    # Build from the largest component to stay away from dividing by zero
+    largest = np.argmax(candidates, axis=-1)
+    root = np.sqrt(np.maximum(np.take_along_axis(candidates, largest[..., None], axis=-1)[..., 0], 1e-12)) * 2
+
+    wx = (m[..., 2, 1] - m[..., 1, 2]) / root
+    wy = (m[..., 0, 2] - m[..., 2, 0]) / root
+    wz = (m[..., 1, 0] - m[..., 0, 1]) / root
+    xy = (m[..., 0, 1] + m[..., 1, 0]) / root
+    xz = (m[..., 0, 2] + m[..., 2, 0]) / root
+    yz = (m[..., 1, 2] + m[..., 2, 1]) / root
+    half = root / 4
+
+    choices = [
+        np.stack([half, wx, wy, wz], axis=-1),
+        np.stack([wx, half, xy, xz], axis=-1),
+        np.stack([wy, xy, half, yz], axis=-1),
+        np.stack([wz, xz, yz, half], axis=-1),
+    ]
+    quaternions = np.select([(largest == i)[..., None] for i in range(4)], choices)
+
+    # Degenerate bases don't give unit quaternions, the zero basis falls back to identity
+    norm = np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    quaternions = np.divide(quaternions, norm, out=np.zeros_like(quaternions), where=norm > 1e-12)
+    quaternions[..., 0] = np.where(norm[..., 0] > 1e-12, quaternions[..., 0], 1.0)
+    return quaternions
+
+
+def make_continuous(quaternions):
+    """Flip signs along the first axis so neighbouring quaternions take the short way round"""
+    if len(quaternions) < 2:
+        return quaternions
+    dots = np.sum(quaternions[1:] * quaternions[:-1], axis=-1)
+    signs = np.cumprod(np.where(dots < 0, -1.0, 1.0), axis=0)
+    quaternions = quaternions.copy()
+    quaternions[1:] *= signs[..., None]
+    return quaternions
+
+
+def reduce_keys(times, local_poses, location_tolerance=DEFAULT_LOCATION_TOLERANCE,
+                rotation_tolerance=DEFAULT_ROTATION_TOLERANCE, scale_tolerance=DEFAULT_SCALE_TOLERANCE):
+    """Pick the keys each bone needs so linear interpolation stays within the tolerances.
+
+    local_poses is (frames, bones, 4, 4). Returns a (frames, bones) bool mask
+    that always keeps the first and last frame. Every bone runs a
+    Douglas-Peucker split, with all open segments of all bones evaluated
+    together at each step.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    frame_count, bone_count = local_poses.shape[:2]
+    keep = np.zeros((frame_count, bone_count), dtype=bool)
+    if frame_count == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    location, rotation, scale = decompose_matrices(np.asarray(local_poses, dtype=np.float64))
+    rotation = make_continuous(rotation)
+    zero_scale = np.abs(scale).min(axis=-1) < ZERO_SCALE
+    tolerances = [max(tolerance, 1e-12) for tolerance in (location_tolerance, rotation_tolerance, scale_tolerance)]
+
+    seg_bone = np.arange(bone_count)
+    seg_start = np.zeros(bone_count, dtype=np.int64)
+    seg_end = np.full(bone_count, frame_count - 1, dtype=np.int64)
+
+    while True:
+        interior = seg_end - seg_start - 1
+        open_segments = interior > 0
+        seg_bone, seg_start, seg_end, interior = (
+            seg_bone[open_segments], seg_start[open_segments], seg_end[open_segments], interior[open_segments]
+        )
+        if len(seg_bone) == 0:
+            break
+
+        # Every interior frame of every open segment, flattened
+        seg_idx = np.repeat(np.arange(len(seg_bone)), interior)
+        first_of_segment = np.cumsum(interior) - interior
+        frames = seg_start[seg_idx] + 1 + np.arange(len(seg_idx)) - first_of_segment[seg_idx]
+        bones = seg_bone[seg_idx]
+        starts = seg_start[seg_idx]
+        ends = seg_end[seg_idx]
+
+        span = times[ends] - times[starts]
+        alpha = np.divide(times[frames] - times[starts], span, out=np.zeros(len(frames)), where=span != 0)[:, None]
+
+        def lerp(values):
+            return values[starts, bones] * (1 - alpha) + values[ends, bones] * alpha
+
+        location_error = np.abs(lerp(location) - location[frames, bones]).max(axis=1)
+        scale_error = np.abs(lerp(scale) - scale[frames, bones]).max(axis=1)
+        blended = lerp(rotation)
+        blend_norm = np.linalg.norm(blended, axis=1, keepdims=True)
+        blended = np.divide(blended, blend_norm, out=np.zeros_like(blended), where=blend_norm > 1e-12)
+        cosine = np.clip(np.abs(np.sum(blended * rotation[frames, bones], axis=1)), 0.0, 1.0)
+        rotation_error = 2 * np.arccos(cosine)
+        # Endpoints more than a half turn apart can't be blended, playback would take the short way
+        opposed = np.sum(rotation[starts, bones] * rotation[ends, bones], axis=1) < 0
+        rotation_error[opposed | (blend_norm[:, 0] <= 1e-12)] = np.inf
+        # A bone scaled to nothing has no rotation worth keeping
+        rotation_error[zero_scale[frames, bones]] = 0.0
+
+        error = np.maximum.reduce([
+            location_error / tolerances[0],
+            rotation_error / tolerances[1],
+            scale_error / tolerances[2],
+        ])
+        # Anything that can't be measured has to be split
+        error[np.isnan(error)] = np.inf
+
+        # Split each segment at its worst frame if that frame is out of tolerance
+        worst = np.maximum.reduceat(error, first_of_segment)
+        at_worst = np.flatnonzero(error == worst[seg_idx])
+        _, first_worst = np.unique(seg_idx[at_worst], return_index=True)
+        split_frames = frames[at_worst[first_worst]]
+
+        split = worst > 1.0
+        split_frames = split_frames[split]
+        keep[split_frames, seg_bone[split]] = True
+
+        seg_bone = np.concatenate([seg_bone[split], seg_bone[split]])
+        seg_start, seg_end = (
+            np.concatenate([seg_start[split], split_frames]),
+            np.concatenate([split_frames, seg_end[split]]),
+        )
+
+    return keep
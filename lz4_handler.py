@@ -1,184 +1,328 @@
-import os
-import struct
-import tempfile
-
-
-def compress_gr2(input_file, output_file):
-    with open(input_file, 'rb') as file:
-        data = bytearray(file.read())
-
-    compressed = bytearray()
-    data_length = len(data)
-
-    if data_length <= 12:
-        # Directly encode small files as literals
-        prefix, _ = encode_literals(data_length, 0, -1)
-        compressed += prefix + data
-    else:
-        sliding_window = {}
-        literal_start = 0
-        pos = 0
-        max_compression_size = data_length / 1.25
-        end_of_file = False
-
-        while pos < data_length and not end_of_file:
-            key = bytes(data[pos:pos + 4])
-            remaining_bytes = calculate_extended_value_length(data_length - pos) + 1
-
-            # Check if adding more data will exceed the max compressed size
-            if len(compressed) + (data_length - pos) + remaining_bytes >= max_compression_size:
-                if key not in sliding_window:
-                    sliding_window[key] = pos
-                    if pos >= data_length - 5:
-                        # Encode trailing literals
-                        prefix, _ = encode_literals(data_length - literal_start, 0, -1)
-                        compressed += prefix + data[literal_start:]
-                        pos = data_length
-                    else:
-                        pos += 1
-                else:
-                    match_pos, match_length = find_match(data, pos, sliding_window)
-                    if match_pos == -1:
-                        pos += 1
-                    else:
-                        if pos + match_length < data_length - 5:
-                            # Encode match
-                            end = pos + match_length
-                            update_pos = pos + 1
-
-                            # Update sliding window for sub-matches
-                            while update_pos < end:
-                                sub_key = bytes(data[update_pos:update_pos + 4])
-                                sliding_window[sub_key] = update_pos
-                                update_pos += 1
-
-                            literal_length = pos - literal_start
-                            match_size = match_length - 4
-                            offset = pos - match_pos
-                            prefix, match_encoding = encode_literals(literal_length, match_size, offset)
-                            compressed += prefix + data[literal_start:pos] + match_encoding
-                            pos += match_length
-                            literal_start = pos
-                        else:
-                            # Encode remaining literals
-                            prefix, _ = encode_literals(data_length - literal_start, 0, -1)
-                            compressed += prefix + data[literal_start:]
-                            pos = data_length
-            else:
-                # End of file: encode remaining data as literals
-                prefix, _ = encode_literals(data_length - literal_start, 0, -1)
-                compressed += prefix + data[literal_start:]
-                end_of_file = True
-
-
-    with open(output_file, "wb") as file:
-        file.write(compressed)
-
-def decompress_lz4(input_file):
-    with open(input_file, 'rb') as f:
-        compressed = f.read()
-
-    decompressed = bytearray()
-    pos = 0
-
-    while pos < len(compressed):
-        token = compressed[pos]
-        pos += 1
-
-        # Decode literal length
-        literal_length = token >> 4
-        if literal_length == 15:
-            extra_length, pos = decode_extended_value(compressed, pos)
-            literal_length += extra_length
-
-        # Copy literals
-        decompressed.extend(compressed[pos:pos + literal_length])
-        pos += literal_length
-
-        if pos >= len(compressed):
-            break
-
-        # Decode match offset
-        match_offset = struct.unpack('<H', compressed[pos:pos + 2])[0]
-        pos += 2
-
-        # Decode match length
-        match_length = (token & 0xF) + 4
-        if match_length - 4 == 15:
-            extra_length, pos = decode_extended_value(compressed, pos)
-            match_length += extra_length
-
-        # Copy match
-        match_start = len(decompressed) - match_offset
-        for _ in range(match_length):
-            decompressed.append(decompressed[match_start])
-            match_start += 1
-
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".gr2", mode='wb')
-    temp_file.write(decompressed)
-    temp_file.close()
-
-    return temp_file.name
-
-# Supporting Functions
-def encode_literals(lit_len, match_len, offset):
-    lit_token = []
-    match_token = []
-
-    if offset != -1:
-        match_token.append(offset % 256)
-        match_token.append(offset // 256)
-
-    if lit_len >= 15:
-        lit_token.append(240)
-        lit_len -= 15
-        lit_token.extend(encode_extended_value(lit_len))
-    else:
-        lit_token.append(lit_len * 16)
-
-    if match_len >= 15:
-        lit_token[0] += 15
-        match_len -= 15
-        match_token.extend(encode_extended_value(match_len))
-    else:
-        lit_token[0] += match_len
-
-    return bytearray(lit_token), bytearray(match_token)
-
-def encode_extended_value(value):
-    result = []
-    while value >= 255:
-        result.append(255)
-        value -= 255
-    result.append(value)
-    return result
-
-def calculate_extended_value_length(value):
-    return (value // 255) + (1 if value % 255 != 0 else 0)
-
-def find_match(data, pos, sliding_window):
-    key = bytes(data[pos:pos + 4])
-    if key in sliding_window:
-        match_pos = sliding_window[key]
-        match_offset = pos - match_pos
-
-        if match_offset > 65535:
-            return -1, 0  # Ignore matches with offsets > 65535
-
-        match_length = 4
-        while pos + match_length < len(data) and data[match_pos + match_length] == data[pos + match_length]:
-            match_length += 1
-
-        return match_pos, match_length
-
-    sliding_window[key] = pos
-    return -1, 0
-
-def decode_extended_value(data, pos):
-    value = 0
-    while data[pos] == 255:
-        value += 255
-        pos += 1
-    value += data[pos]
-    pos += 1
+import mmap
+import os
+import struct
+from array import array
+
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None
+
+
+# Block format limits from the LZ4 spec
+MIN_MATCH = 4
+MAX_OFFSET = 65535
+LAST_LITERALS = 5
+MF_LIMIT = 12
+
+HASH_LOG = 16
+
+# level -> (chain candidates searched per position, lazy matching)
+COMPRESSION_LEVELS = {
+    'fast': (1, False),
+    'high': (16, True),
+}
+
+# LZ4 cannot expand a block by more than this factor
+MAX_EXPANSION = 255
+
+# GR2 files open with a 32 byte magic block, the header after it starts with version and total size
+GR2_TOTAL_SIZE_OFFSET = 36
+
+
+def compress_gr2(input_file, output_file, level='fast'):
+    with open(input_file, 'rb') as file:
+        data = file.read()
+
+    compressed = compress_lz4_data(data, level)
+
+    with open(output_file, "wb") as file:
+        file.write(compressed)
+
+def compress_lz4_data(data, level='fast'):
+    if level not in COMPRESSION_LEVELS:
+        raise ValueError(f"Unknown LZ4 compression level '{level}'.")
+    return BACKENDS[active_backend][0](data, level)
+
+def decompress_lz4_file(input_file, size_hint=None):
+    with open(input_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return bytearray()
+        # Map the file so the compressed data is never copied into memory
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as compressed:
+                if size_hint is None:
+                    size_hint = gr2_size_hint(compressed)
+                return decompress_lz4_data(compressed, size_hint)
+
+def decompress_lz4_data(data, size_hint=None):
+    return BACKENDS[active_backend][1](data, size_hint)
+
+def gr2_size_hint(compressed):
+    """The file size a GR2 header states, decoded from the start of the block, or None"""
+    try:
+        header = decode_block(compressed, GR2_TOTAL_SIZE_OFFSET + 4)
+    except (IndexError, ValueError):
+        return None
+    if len(header) < GR2_TOTAL_SIZE_OFFSET + 4:
+        return None
+    total_size = struct.unpack_from('<I', header, GR2_TOTAL_SIZE_OFFSET)[0]
+    # Anything LZ4 could not have produced from this block is not a GR2 header
+    if 0 < total_size <= len(compressed) * MAX_EXPANSION:
+        return total_size
+    return None
+
+def get_backend():
+    return active_backend
+
+def set_backend(name):
+    global active_backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LZ4 backend '{name}'.")
+    if name == 'native' and lz4_block is None:
+        raise ValueError("The native LZ4 backend needs the 'lz4' module.")
+    active_backend = name
+
+def native_compress(data, level):
+    mode = 'high_compression' if level == 'high' else 'default'
+    return lz4_block.compress(data, mode=mode, store_size=False)
+
+def native_decompress(data, size_hint=None):
+    if len(data) == 0:
+        return bytes()
+    # Raw blocks carry no size, so retry with a larger buffer until it fits
+    capacity = size_hint if size_hint else max(len(data) * 4, 64)
+    max_capacity = max(len(data) * MAX_EXPANSION, 64)
+    while True:
+        try:
+            return lz4_block.decompress(data, uncompressed_size=capacity)
+        except lz4_block.LZ4BlockError:
+            if capacity >= max_capacity:
+                raise
+            capacity = min(capacity * 2, max_capacity)
+
+def python_compress(data, level='fast'):
+    max_attempts, lazy = COMPRESSION_LEVELS[level]
+
+    data = bytes(data)
+    data_length = len(data)
+    compressed = bytearray()
+
+    if data_length <= MF_LIMIT:
+        # Directly encode small files as literals
+        prefix, _ = encode_literals(data_length, 0, -1)
+        compressed += prefix + data
+        return compressed
+
+    read_word = struct.Struct('<I').unpack_from
+    hash_shift = 32 - HASH_LOG
+    head = array('i', [-1]) * (1 << HASH_LOG)
+    chain = array('i', [-1]) * data_length if max_attempts > 1 else None
+
+    match_limit = data_length - LAST_LITERALS   # matches must end before the last literals
+    search_limit = data_length - MF_LIMIT       # and start early enough to leave room for them
+    literal_start = 0
+    pos = 0
+    inserted = 0
+    misses = 0
+
+    def find_longest_match(pos):
+        nonlocal inserted
+        word = read_word(data, pos)[0]
+
+        if chain is None:
+            # Fast level only tracks the latest position per hash
+            h = ((word * 2654435761) & 0xFFFFFFFF) >> hash_shift
+            candidate = head[h]
+            head[h] = pos
+            candidates = (candidate,)
+        else:
+            # Insert every position we skipped over so the chains see them
+            while inserted <= pos:
+                h = ((read_word(data, inserted)[0] * 2654435761) & 0xFFFFFFFF) >> hash_shift
+                chain[inserted] = head[h]
+                head[h] = inserted
+                inserted += 1
+            candidates = walk_chain(chain[pos])
+
+        best_pos = -1
+        best_length = 0
+        for candidate in candidates:
+            if candidate < 0 or pos - candidate > MAX_OFFSET:
+                break
+            if read_word(data, candidate)[0] != word:
+                continue
+            length = extend_match(data, candidate, pos, match_limit)
+            if length > best_length:
+                best_pos = candidate
+                best_length = length
+        return best_pos, best_length
+
+    def walk_chain(candidate):
+        for _ in range(max_attempts):
+            if candidate < 0:
+                return
+            yield candidate
+            candidate = chain[candidate]
+
+    while pos < search_limit:
+        match_pos, match_length = find_longest_match(pos)
+        if match_length < MIN_MATCH:
+            # Skip faster through data that keeps failing to match
+            misses += 1
+            pos += 1 if lazy else 1 + (misses >> 6)
+            continue
+        misses = 0
+
+        if lazy:
+            # Defer the match while the next position offers a longer one
+            while pos + 1 < search_limit:
+                next_pos, next_length = find_longest_match(pos + 1)
+                if next_length <= match_length:
+                    break
+                pos += 1
+                match_pos, match_length = next_pos, next_length
+
+        literal_length = pos - literal_start
+        prefix, match_encoding = encode_literals(literal_length, match_length - MIN_MATCH, pos - match_pos)
+        compressed += prefix
+        compressed += data[literal_start:pos]
+        compressed += match_encoding
+        pos += match_length
+        literal_start = pos
+
+    # Encode remaining literals
+    prefix, _ = encode_literals(data_length - literal_start, 0, -1)
+    compressed += prefix
+    compressed += data[literal_start:]
+    return compressed
+
+def decompress_lz4(input_file, output_file=None):
+    decompressed = decompress_lz4_file(input_file)
+
+    # Without a destination the .gr2 lives in the session's scratch folder
+    if output_file is None:
+        # Imported here so the benchmark can load this module on its own
+        from .scratch import scratch_workspace
+        output_file = scratch_workspace.new_file(".gr2", len(decompressed))
+    with open(output_file, 'wb') as file:
+        file.write(decompressed)
+
+    return output_file
+
+def python_decompress(data, size_hint=None):
+    # Appending to a bytearray beats preallocating here, so the size hint is not needed
+    compressed = memoryview(data)
+    try:
+        return decode_block(compressed)
+    except IndexError:
+        raise ValueError("Truncated LZ4 block.") from None
+    finally:
+        # A view left alive by the traceback would keep a mapped input file from closing
+        compressed.release()
+
+def decode_block(compressed, limit=None):
+    """Decode a raw LZ4 block, stopping early once limit bytes are out"""
+    compressed_length = len(compressed)
+    decompressed = bytearray()
+    pos = 0
+
+    while pos < compressed_length:
+        token = compressed[pos]
+        pos += 1
+
+        # Decode and copy literals
+        literal_length = token >> 4
+        if literal_length:
+            if literal_length == 15:
+                extra_length, pos = decode_extended_value(compressed, pos)
+                literal_length += extra_length
+            decompressed += compressed[pos:pos + literal_length]
+            pos += literal_length
+
+        if pos >= compressed_length or (limit is not None and len(decompressed) >= limit):
+            break
+
+        # Decode match offset
+        match_offset = compressed[pos] | (compressed[pos + 1] << 8)
+        pos += 2
+
+        # Decode match length
+        match_length = (token & 0xF) + 4
+        if match_length == 19:
+            extra_length, pos = decode_extended_value(compressed, pos)
+            match_length += extra_length
+
+        match_start = len(decompressed) - match_offset
+        if match_offset == 0 or match_start < 0:
+            raise ValueError(f"Invalid LZ4 match offset {match_offset} at output position {len(decompressed)}.")
+
+        # Copy match
+        if match_offset >= match_length:
+            decompressed += decompressed[match_start:match_start + match_length]
+        else:
+            # Overlapping match: the last match_offset bytes repeat for the whole length
+            pattern = decompressed[match_start:]
+            repeats, remainder = divmod(match_length, match_offset)
+            decompressed += pattern * repeats
+            decompressed += pattern[:remainder]
+
+    return decompressed
+
+BACKENDS = {
+    'native': (native_compress, native_decompress),
+    'python': (python_compress, python_decompress),
+}
+active_backend = 'native' if lz4_block is not None else 'python'
+
+# Supporting Functions
+def encode_literals(lit_len, match_len, offset):
+    lit_token = []
+    match_token = []
+
+    if offset != -1:
+        match_token.append(offset % 256)
+        match_token.append(offset // 256)
+
+    if lit_len >= 15:
+        lit_token.append(240)
+        lit_len -= 15
+        lit_token.extend(encode_extended_value(lit_len))
+    else:
+        lit_token.append(lit_len * 16)
+
+    if match_len >= 15:
+        lit_token[0] += 15
+        match_len -= 15
+        match_token.extend(encode_extended_value(match_len))
+    else:
+        lit_token[0] += match_len
+
+    return bytearray(lit_token), bytearray(match_token)
+
+def encode_extended_value(value):
+    result = []
+    while value >= 255:
+        result.append(255)
+        value -= 255
+    result.append(value)
+    return result
+
+def extend_match(data, match_pos, pos, limit):
+    # Compare in blocks first, then finish byte by byte
+    length = MIN_MATCH
+    max_length = limit - pos
+    while length + 32 <= max_length and data[match_pos + length:match_pos + length + 32] == data[pos + length:pos + length + 32]:
+        length += 32
+    while length < max_length and data[match_pos + length] == data[pos + length]:
+        length += 1
+    return length
+
+def decode_extended_value(data, pos):
+    value = 0
+    while data[pos] == 255:
+        value += 255
+        pos += 1
+    value += data[pos]
+    pos += 1
     return value, pos
\ No newline at end of file
@@ -0,0 +1,124 @@
+import hashlib
+import io
+import os
+import numpy as np
+from .collada_reader import ColladaModel
+from .divine_handler import DaeCache
+from .skin_weights import SkinWeights
+
+# Bump whenever ColladaModel or the arrays written here change shape or meaning
+MODEL_CACHE_VERSION = 1
+
+
+class ModelCache(DaeCache):
+    """Parsed ColladaModels stored as .npz, keyed by the source .lz4 contents"""
+
+    suffix = ".npz"
+    kind = "models"
+
+    def file_key(self, lz4_path):
+        digest = hashlib.sha256()
+        with open(lz4_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key):
+        # Older versions keep their own names and age out through eviction
+        return super().path(f"{key}.v{MODEL_CACHE_VERSION}")
+
+    def load(self, key):
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+                return model_from_arrays(arrays)
+        except Exception as e:
+            # Truncated files fail inside zipfile, anything unreadable is a miss
+            print(f"Warning: discarding unreadable model cache entry {key}: {e}")
+            self.hits -= 1
+            self.misses += 1
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            return None
+
+    def store(self, key, model):
+        buffer = io.BytesIO()
+        np.savez(buffer, **model_to_arrays(model))
+        self.put(key, buffer.getvalue())
+
+
+def model_to_arrays(model):
+    arrays = {
+        'version': np.array(MODEL_CACHE_VERSION),
+        'has_visual_scene': np.array(model.has_visual_scene),
+        'joint_names': np.array([name for name, _, _ in model.joints], dtype=str),
+        'joint_parents': np.array([parent for _, parent, _ in model.joints], dtype=np.int32),
+        'joint_has_matrix': np.array([matrix is not None for _, _, matrix in model.joints], dtype=bool),
+        'joint_matrices': np.array(
+            [matrix if matrix is not None else [0.0] * 16 for _, _, matrix in model.joints],
+            dtype=np.float64,
+        ).reshape(-1, 16),
+        'geometry_ids': np.array([geom_id or "" for geom_id, _ in model.geometries], dtype=str),
+        'skin_ids': np.array(list(model.controllers), dtype=str),
+    }
+
+    for i, (_, result) in enumerate(model.geometries):
+        mesh_name, positions, uvs, normals, faces, (pos_offsets, pos_vertices) = result
+        arrays[f'geometry{i}_name'] = np.array(mesh_name)
+        arrays[f'geometry{i}_positions'] = positions
+        arrays[f'geometry{i}_uvs'] = uvs
+        arrays[f'geometry{i}_normals'] = normals
+        arrays[f'geometry{i}_faces'] = faces
+        arrays[f'geometry{i}_pos_offsets'] = pos_offsets
+        arrays[f'geometry{i}_pos_vertices'] = pos_vertices
+
+    for i, skin in enumerate(model.controllers.values()):
+        arrays[f'skin{i}_joint_names'] = np.array(skin.joint_names, dtype=str)
+        arrays[f'skin{i}_offsets'] = skin.offsets
+        arrays[f'skin{i}_joints'] = skin.joints
+        arrays[f'skin{i}_weights'] = skin.weights
+
+    return arrays
+
+
+def model_from_arrays(arrays):
+    if int(arrays['version']) != MODEL_CACHE_VERSION:
+        raise ValueError(f"cache version {int(arrays['version'])}, expected {MODEL_CACHE_VERSION}")
+
+    model = ColladaModel()
+    model.has_visual_scene = bool(arrays['has_visual_scene'])
+
+    for name, parent, has_matrix, matrix in zip(
+        arrays['joint_names'].tolist(),
+        arrays['joint_parents'].tolist(),
+        arrays['joint_has_matrix'].tolist(),
+        arrays['joint_matrices'].tolist(),
+    ):
+        model.joints.append((name, parent, matrix if has_matrix else None))
+
+    for i, geom_id in enumerate(arrays['geometry_ids'].tolist()):
+        result = (
+            str(arrays[f'geometry{i}_name']),
+            arrays[f'geometry{i}_positions'],
+            arrays[f'geometry{i}_uvs'],
+            arrays[f'geometry{i}_normals'],
+            arrays[f'geometry{i}_faces'],
+            (arrays[f'geometry{i}_pos_offsets'], arrays[f'geometry{i}_pos_vertices']),
+        )
+        model.geometries.append((geom_id or None, result))
+
+    for i, geom_id in enumerate(arrays['skin_ids'].tolist()):
+        model.controllers[geom_id] = SkinWeights(
+            arrays[f'skin{i}_joint_names'].tolist(),
+            arrays[f'skin{i}_offsets'],
+            arrays[f'skin{i}_joints'],
+            arrays[f'skin{i}_weights'],
+        )
+
+    return model
+
+model_cache = ModelCache()
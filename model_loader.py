@@ -0,0 +1,132 @@
+import time
+from .lz4_handler import decompress_lz4_file
+from .divine_handler import gr2_data_to_dae, gr2_data_to_dae_batch
+from .collada_reader import read_collada
+from .model_cache import model_cache
+from .instrumentation import StageRecorder
+
+
+def prepare_hades_model(lz4_model_path, parse_workers=1, use_cache=True, stages=None, cache_key=None):
+    """Decompress, convert and parse one .lz4 model without touching bpy"""
+    stages = stages or StageRecorder()
+
+    model, gr2_data, cache_key = load_or_decompress(lz4_model_path, use_cache, stages, cache_key)
+    if model is not None:
+        return model
+
+    with stages.stage('convert'):
+        dae_data = gr2_data_to_dae(gr2_data)
+    if not dae_data:
+        raise Exception("Failed to convert GR2 to DAE.")
+
+    return parse_hades_model(dae_data, parse_workers, use_cache, stages, cache_key)
+
+def prepare_hades_models(lz4_model_paths, parse_workers=1, use_cache=True, pool=None, cache_keys=None, stages=None):
+    """Prepare several models with a single Divine run for every GR2 the caches can't answer.
+
+    Decompression and parsing are mapped over pool when one is given. Every
+    model is credited the time of the shared conversion. Returns (model,
+    stages, error) per path, in order.
+    """
+    map_function = pool.map if pool is not None else map
+    cache_keys = cache_keys or [None] * len(lz4_model_paths)
+    stages = stages or [StageRecorder() for _ in lz4_model_paths]
+
+    def load(path, cache_key, file_stages):
+        try:
+            return load_or_decompress(path, use_cache, file_stages, cache_key) + (None,)
+        except Exception as e:
+            return None, None, cache_key, str(e)
+
+    loaded = list(map_function(load, lz4_model_paths, cache_keys, stages))
+    results = [(model, file_stages, error) for (model, _, _, error), file_stages in zip(loaded, stages)]
+
+    #one Divine run converts everything that still needs it
+    pending = [index for index, (model, _, _, error) in enumerate(loaded) if model is None and error is None]
+    if not pending:
+        return results
+    convert_start = time.perf_counter()
+    conversions = gr2_data_to_dae_batch([loaded[index][1] for index in pending])
+    convert_time = time.perf_counter() - convert_start
+
+    def parse(index, conversion):
+        dae_data, error = conversion
+        file_stages = stages[index]
+        file_stages.add('convert', convert_time)
+        if error or not dae_data:
+            return None, file_stages, error or "Failed to convert GR2 to DAE."
+        try:
+            return parse_hades_model(dae_data, parse_workers, use_cache, file_stages, loaded[index][2]), file_stages, None
+        except Exception as e:
+            return None, file_stages, str(e)
+
+    for index, result in zip(pending, map_function(parse, pending, conversions)):
+        results[index] = result
+    return results
+
+def load_or_decompress(lz4_model_path, use_cache, stages, cache_key=None):
+    """The cached model if there is one, otherwise the decompressed GR2 data, plus the cache key"""
+    #a parsed copy of this exact file skips decompression, conversion and parsing
+    if use_cache:
+        with stages.stage('cache'):
+            cache_key = cache_key or model_cache.file_key(lz4_model_path)
+            model = model_cache.load(cache_key)
+        if model is not None:
+            return model, None, cache_key
+
+    with stages.stage('decompress'):
+        gr2_data = decompress_lz4_file(lz4_model_path)
+    if not gr2_data:
+        raise Exception("Failed to decompress LZ4 file.")
+    return None, gr2_data, cache_key
+
+def parse_hades_model(dae_data, parse_workers, use_cache, stages, cache_key):
+    #read the DAE in one streaming pass shared by the skeleton and mesh importers
+    with stages.stage('parse'):
+        model = read_collada(dae_data, workers=parse_workers)
+
+    if use_cache:
+        try:
+            with stages.stage('cache'):
+                model_cache.store(cache_key, model)
+        except OSError as e:
+            print(f"Warning: could not cache parsed model: {e}")
+
+    return model
+
+
+def preprocess_hades_models(lz4_model_paths, parse_workers=1):
+    """Fill the model cache for several files with one Divine run and describe each result, used by the command line"""
+    records = [{'status': 'ok', 'error': None} for _ in lz4_model_paths]
+    stages = [StageRecorder() for _ in lz4_model_paths]
+
+    hashed = []
+    for index, (path, record, file_stages) in enumerate(zip(lz4_model_paths, records, stages)):
+        try:
+            with file_stages.stage('hash'):
+                record['cache_key'] = model_cache.file_key(path)
+            hashed.append(index)
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = str(e)
+
+    results = prepare_hades_models(
+        [lz4_model_paths[index] for index in hashed], parse_workers, True,
+        cache_keys=[records[index]['cache_key'] for index in hashed],
+        stages=[stages[index] for index in hashed],
+    )
+    for index, (model, file_stages, error) in zip(hashed, results):
+        record = records[index]
+        if error is not None:
+            record['status'] = 'error'
+            record['error'] = error
+            continue
+        record['cached'] = 'parse' not in file_stages.timings
+        record['joints'] = len(model.joints)
+        record['geometries'] = len(model.geometries)
+        record['skins'] = len(model.controllers)
+
+    for record, file_stages in zip(records, stages):
+        record['seconds'] = round(file_stages.total(), 6)
+        record['stages'] = {name: round(seconds, 6) for name, seconds in file_stages.timings.items()}
+    return records
@@ -0,0 +1,658 @@
+import bpy
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from bpy_extras.io_utils import ImportHelper
+from bpy.props import StringProperty, EnumProperty, BoolProperty, IntProperty, FloatProperty, CollectionProperty
+from .lz4_handler import *
+from .divine_handler import dae_to_gr2, convert_models, dae_cache, CACHE_SIZE_ENV
+from .skeleton_handler import (
+    import_collada_skeleton, export_collada_skeleton, export_sampled_animation, sample_animation,
+    write_sampled_animation, SampledAnimation,
+)
+from .mesh_handler import import_collada_meshes
+from .model_loader import prepare_hades_model, prepare_hades_models
+from .model_cache import model_cache
+from .animation_sampler import action_fingerprint
+from .export_manifest import load_export_manifest, save_export_manifest, is_export_current, record_export
+from .keyframe_reduction import DEFAULT_LOCATION_TOLERANCE, DEFAULT_ROTATION_TOLERANCE, DEFAULT_SCALE_TOLERANCE
+from .scratch import scratch_workspace, KEEP_SCRATCH_ENV
+from .instrumentation import (
+    StageRecorder, append_stage_log, profiled, STAGE_LOG_ENV, TRACE_MEMORY_ENV, PROFILE_DIR_ENV,
+)
+
+class HadesAddonPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    parse_workers: IntProperty(
+        name="Geometry Parse Workers",
+        description="Threads used to parse the meshes of a model, 1 parses them one after another",
+        default=1,
+        min=1,
+        max=64,
+    )
+    use_model_cache: BoolProperty(
+        name="Cache Parsed Models",
+        description="Keep parsed models on disk so re-importing a file skips decompression, conversion and XML parsing",
+        default=True,
+    )
+    cache_size_mb: IntProperty(
+        name="Cache Size (MB)",
+        description="Size limit of the GR2 conversion cache and of the parsed model cache, the least recently used files go first",
+        default=2048,
+        min=0,
+        max=1024 * 1024,
+    )
+
+    stage_log_path: StringProperty(
+        name="Stage Log",
+        description="Append a JSON line with per-stage timings for every import and export to this file",
+        subtype='FILE_PATH',
+        default="",
+    )
+    trace_memory: BoolProperty(
+        name="Trace Peak Memory",
+        description="Record the peak Python and NumPy memory of each stage, this slows imports down",
+        default=False,
+    )
+    profile_dir: StringProperty(
+        name="Profile Folder",
+        description="Run imports and exports under cProfile and write the stats into this folder",
+        subtype='DIR_PATH',
+        default="",
+    )
+
+    keep_scratch_files: BoolProperty(
+        name="Keep Scratch Files",
+        description="Leave intermediate .gr2 and .dae files in the scratch folder for debugging",
+        default=False,
+    )
+
+    def draw(self, context):
+        self.layout.prop(self, "parse_workers")
+        self.layout.prop(self, "use_model_cache")
+        self.layout.prop(self, "cache_size_mb")
+        self.layout.prop(self, "stage_log_path")
+        self.layout.prop(self, "trace_memory")
+        self.layout.prop(self, "profile_dir")
+        self.layout.prop(self, "keep_scratch_files")
+
+class ImportHadesFile(bpy.types.Operator, ImportHelper):
+    """Import Hades Model File"""
+    bl_idname = "import_scene.hades_model"
+    bl_label = "Import Hades Model"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filename_ext = ".lz4"
+    filter_glob: StringProperty(default="*.lz4", options={'HIDDEN'}, maxlen=255)
+
+    def execute(self, context):
+        if bpy.context.space_data.type == 'VIEW_3D':
+            bpy.context.space_data.shading.show_backface_culling = True
+
+        lz4_model_path = self.filepath
+        preferences = get_preferences(context)
+        apply_pipeline_preferences(preferences)
+        log_path, trace_memory, profile_dir = instrumentation_settings(preferences)
+        stages = StageRecorder(trace_memory)
+        error = None
+
+        try:
+            with profiled(profile_dir, "import"):
+                self.report({'INFO'}, "Reading model...")
+                model = prepare_hades_model(
+                    lz4_model_path, preferences.parse_workers, preferences.use_model_cache, stages
+                )
+
+                self.report({'INFO'}, "Importing COLLADA skeleton...")
+                build_hades_model(context, model, stages)
+
+            self.report({'INFO'}, f"Model imported successfully in {stages.total():.2f}s ({stages.summary()}).")
+
+        except Exception as e:
+            error = str(e)
+            self.report({'ERROR'}, f"Import failed: {e} ({stages.summary()})")
+        finally:
+            stages.stop()
+            if log_path:
+                append_stage_log(log_path, stages.record(operator=self.bl_idname, file=lz4_model_path, error=error))
+
+        return {'FINISHED'} if error is None else {'CANCELLED'}
+
+class ImportHadesFiles(bpy.types.Operator, ImportHelper):
+    """Import several Hades Model Files at once"""
+    bl_idname = "import_scene.hades_models"
+    bl_label = "Import Hades Models"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filename_ext = ".lz4"
+    filter_glob: StringProperty(default="*.lz4", options={'HIDDEN'}, maxlen=255)
+    files: CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: StringProperty(subtype='DIR_PATH')
+    whole_directory: BoolProperty(
+        name="Whole Folder",
+        description="Import every .lz4 file in the folder instead of only the selected ones",
+        default=False,
+    )
+    workers: IntProperty(
+        name="Workers",
+        description="Files decompressed and parsed in parallel, Divine converts all of them in one run",
+        default=min(8, os.cpu_count() or 1),
+        min=1,
+        max=64,
+    )
+
+    def execute(self, context):
+        if bpy.context.space_data.type == 'VIEW_3D':
+            bpy.context.space_data.shading.show_backface_culling = True
+
+        if self.whole_directory:
+            lz4_model_paths = sorted(
+                os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.lower().endswith(".lz4")
+            )
+        else:
+            lz4_model_paths = [os.path.join(self.directory, file.name) for file in self.files if file.name]
+            if not lz4_model_paths and self.filepath:
+                lz4_model_paths = [self.filepath]
+
+        if not lz4_model_paths:
+            self.report({'ERROR'}, "No .lz4 files selected.")
+            return {'CANCELLED'}
+
+        start_time = time.perf_counter()
+        preferences = get_preferences(context)
+        apply_pipeline_preferences(preferences)
+        log_path, _, profile_dir = instrumentation_settings(preferences)
+
+        #decompress and parse in the pool with one Divine run in between, bpy is only touched on this thread
+        #peak memory is not traced here, tracemalloc cannot tell the pool's threads apart
+        parse_workers = preferences.parse_workers
+        use_model_cache = preferences.use_model_cache
+        with profiled(profile_dir, "import-batch"):
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = prepare_hades_models(lz4_model_paths, parse_workers, use_model_cache, pool)
+                prepared = list(zip(lz4_model_paths, results))
+
+            imported = 0
+            with suspend_undo(context):
+                for lz4_model_path, (model, stages, error) in prepared:
+                    name = os.path.basename(lz4_model_path)
+                    if error is None:
+                        try:
+                            build_hades_model(context, model, stages)
+                        except Exception as e:
+                            error = str(e)
+
+                    if error is None:
+                        imported += 1
+                        self.report({'INFO'}, f"{name}: {stages.summary()}")
+                    else:
+                        self.report({'WARNING'}, f"{name} failed: {error} ({stages.summary()})")
+                    if log_path:
+                        append_stage_log(log_path, stages.record(operator=self.bl_idname, file=lz4_model_path, error=error))
+
+        elapsed = time.perf_counter() - start_time
+        self.report({'INFO'}, f"Imported {imported} of {len(lz4_model_paths)} models in {elapsed:.2f}s.")
+        return {'FINISHED'} if imported else {'CANCELLED'}
+
+class AnimationExportSettings:
+    """Settings shared by the single and batch animation exporters"""
+
+    compression_level: EnumProperty(
+        name="Compression",
+        items=[
+            ('fast', "Fast", "Quick LZ4 compression"),
+            ('high', "High", "Slower LZ4 compression with a smaller output"),
+        ],
+        default='fast',
+    )
+    use_direct_sampler: BoolProperty(
+        name="Direct Sampler",
+        description="Sample the pose bones directly instead of running Blender's COLLADA exporter, experimental until its GR2 output is checked against the exporter's",
+        default=False,
+    )
+    reduce_keys: BoolProperty(
+        name="Reduce Keyframes",
+        description="Drop sampled keys that linear interpolation recovers within the tolerances (Direct Sampler only)",
+        default=False,
+    )
+    location_tolerance: FloatProperty(
+        name="Location Tolerance",
+        description="Largest allowed location error of a dropped key",
+        default=DEFAULT_LOCATION_TOLERANCE,
+        min=0.0,
+        precision=5,
+    )
+    rotation_tolerance: FloatProperty(
+        name="Rotation Tolerance",
+        description="Largest allowed rotation error of a dropped key",
+        subtype='ANGLE',
+        default=DEFAULT_ROTATION_TOLERANCE,
+        min=0.0,
+        precision=3,
+    )
+    scale_tolerance: FloatProperty(
+        name="Scale Tolerance",
+        description="Largest allowed scale error of a dropped key",
+        default=DEFAULT_SCALE_TOLERANCE,
+        min=0.0,
+        precision=5,
+    )
+
+    def key_tolerances(self):
+        if not (self.use_direct_sampler and self.reduce_keys):
+            return None
+        return (self.location_tolerance, self.rotation_tolerance, self.scale_tolerance)
+
+class ExportHadesAnimation(bpy.types.Operator, AnimationExportSettings, ImportHelper):
+    """Export Hades Animation"""
+    bl_idname = "export_scene.hades_animation"
+    bl_label = "Export Hades Animation"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filename_ext = ".gr2.lz4"
+    filter_glob: StringProperty(default="*.gr2.lz4", options={'HIDDEN'}, maxlen=255)
+
+    def execute(self, context):
+        if not self.filepath.lower().endswith(".gr2.lz4"):
+            export_path = os.path.splitext(self.filepath)[0] + self.filename_ext
+        else:
+            export_path = self.filepath
+        preferences = get_preferences(context)
+        apply_pipeline_preferences(preferences)
+        log_path, trace_memory, profile_dir = instrumentation_settings(preferences)
+        stages = StageRecorder(trace_memory)
+        error = None
+        
+        try:
+            self.report({'INFO'}, f"Exporting animation to {export_path}...")
+
+            with profiled(profile_dir, "export"):
+                #first get the armature
+                armature = select_export_armature(context)
+
+                #intermediate .dae and .gr2 files live in one scratch folder that goes away with the export
+                with scratch_workspace.stage("export") as scratch_dir:
+                    #then write the joints and animation to a .dae, the default exporter is the fallback
+                    with stages.stage('export_dae'):
+                        dae_model_path = None
+                        key_counts = None
+                        if self.use_direct_sampler:
+                            try:
+                                dae_model_path, key_counts = export_sampled_animation(
+                                    context, armature, self.key_tolerances(), scratch_dir
+                                )
+                            except Exception as e:
+                                self.report({'WARNING'}, f"Direct sampling failed, using the COLLADA exporter: {e}")
+                        if not dae_model_path:
+                            dae_model_path = export_collada_skeleton(context, armature, scratch_dir)
+                        elif self.reduce_keys and key_counts:
+                            self.report({'INFO'}, key_reduction_summary(dae_model_path, *key_counts))
+
+                    #then convert to gr2 with divine.exe
+                    with stages.stage('convert'):
+                        gr2_model_path = dae_to_gr2(dae_model_path, os.path.join(scratch_dir, os.path.basename(export_path)))
+                    if not gr2_model_path:
+                        raise Exception("Failed to convert DAE to GR2.")
+
+                    #finally compress to lz4
+                    with stages.stage('compress'):
+                        compress_gr2(gr2_model_path, export_path, self.compression_level)
+
+            self.report({'INFO'}, f"Animation exported successfully in {stages.total():.2f}s ({stages.summary()}).")
+        except Exception as e:
+            error = str(e)
+            self.report({'ERROR'}, f"Export failed: {e} ({stages.summary()})")
+        finally:
+            stages.stop()
+            if log_path:
+                append_stage_log(log_path, stages.record(operator=self.bl_idname, file=export_path, error=error))
+
+        return {'FINISHED'} if error is None else {'CANCELLED'}
+
+
+class ActionExportItem(bpy.types.PropertyGroup):
+    name: StringProperty()
+    export: BoolProperty(name="Export", default=True)
+
+class ExportHadesAnimations(bpy.types.Operator, AnimationExportSettings, ImportHelper):
+    """Export several actions of the armature, one .gr2.lz4 each"""
+    bl_idname = "export_scene.hades_animations"
+    bl_label = "Export Hades Animations"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filename_ext = ".gr2.lz4"
+    filter_glob: StringProperty(default="*.gr2.lz4", options={'HIDDEN'}, maxlen=255)
+    directory: StringProperty(subtype='DIR_PATH')
+    actions: CollectionProperty(type=ActionExportItem)
+    only_changed: BoolProperty(
+        name="Only Changed",
+        description="Skip actions whose keys, frame range, rest pose and settings match the last export to this folder",
+        default=True,
+    )
+    workers: IntProperty(
+        name="Workers",
+        description="Actions written and compressed in parallel, Divine converts all of them in one run",
+        default=min(8, os.cpu_count() or 1),
+        min=1,
+        max=64,
+    )
+
+    def invoke(self, context, event):
+        armature = select_export_armature(context)
+        if armature is None:
+            self.report({'ERROR'}, "No armature to export.")
+            return {'CANCELLED'}
+
+        self.actions.clear()
+        for action in bpy.data.actions:
+            if any(fcurve.data_path.startswith("pose.bones") for fcurve in action.fcurves):
+                item = self.actions.add()
+                item.name = action.name
+        return super().invoke(context, event)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "workers")
+        layout.prop(self, "only_changed")
+        layout.prop(self, "compression_level")
+        layout.prop(self, "use_direct_sampler")
+        if self.use_direct_sampler:
+            layout.prop(self, "reduce_keys")
+        if self.use_direct_sampler and self.reduce_keys:
+            layout.prop(self, "location_tolerance")
+            layout.prop(self, "rotation_tolerance")
+            layout.prop(self, "scale_tolerance")
+
+        box = layout.box()
+        box.label(text="Actions")
+        for item in self.actions:
+            box.prop(item, "export", text=item.name)
+
+    def execute(self, context):
+        armature = select_export_armature(context)
+        actions = [bpy.data.actions[item.name] for item in self.actions if item.export and item.name in bpy.data.actions]
+        if armature is None or not actions:
+            self.report({'ERROR'}, "No armature or no actions to export.")
+            return {'CANCELLED'}
+
+        preferences = get_preferences(context)
+        apply_pipeline_preferences(preferences)
+        log_path, _, profile_dir = instrumentation_settings(preferences)
+        start_time = time.perf_counter()
+        export_dir = self.directory or os.path.dirname(self.filepath)
+        manifest = load_export_manifest(export_dir)
+        #the frame rate sets every key time in the DAE, so a change has to re-export
+        render = context.scene.render
+        settings = {
+            'compression_level': self.compression_level,
+            'direct_sampler': self.use_direct_sampler,
+            'key_tolerances': self.key_tolerances(),
+            'fps': [render.fps, render.fps_base],
+        }
+
+        with profiled(profile_dir, "export-batch"):
+            #actions whose fingerprint and output file match the manifest are left alone
+            pending = []
+            rejected = []
+            claimed_paths = {}
+            for action in actions:
+                export_path = os.path.join(export_dir, bpy.path.clean_name(action.name) + self.filename_ext)
+                #names like Run.L and Run_L clean to the same file, only the first of them is exported
+                path_key = os.path.normcase(export_path)
+                if path_key in claimed_paths:
+                    rejected.append((action.name, claimed_paths[path_key]))
+                    continue
+                claimed_paths[path_key] = action.name
+
+                fingerprint = action_fingerprint(armature, action, *action_frame_range(action), settings)
+                if self.only_changed and is_export_current(manifest, export_path, fingerprint):
+                    continue
+                pending.append((action, export_path, fingerprint))
+
+            #one step for preparing each action and one for finishing it
+            window_manager = context.window_manager
+            window_manager.progress_begin(0, max(len(pending) * 2, 1))
+            progress = itertools.count(1)
+            step = lambda: window_manager.progress_update(next(progress))
+            try:
+                with scratch_workspace.stage("collada") as collada_dir:
+                    #sampling and the COLLADA exporter evaluate the scene, so they stay on this thread
+                    prepared_actions = prepare_actions(
+                        context, armature, [action for action, _, _ in pending],
+                        self.use_direct_sampler, self.key_tolerances(), collada_dir, step,
+                    )
+
+                    #writing sampled arrays and LZ4 don't touch bpy and run in the pool, Divine runs once
+                    with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                        results = finish_actions(
+                            prepared_actions, [export_path for _, export_path, _ in pending],
+                            self.compression_level, collada_dir, pool, step,
+                        )
+            finally:
+                window_manager.progress_end()
+
+        for action_name, claimed_by in rejected:
+            self.report({'WARNING'}, f"{action_name} skipped: it would overwrite the export of {claimed_by}.")
+
+        exported = 0
+        for (_, export_path, fingerprint), (action_name, _, stages, _), error in zip(pending, prepared_actions, results):
+            if error is None:
+                exported += 1
+                record_export(manifest, export_path, fingerprint, action_name)
+                self.report({'INFO'}, f"{action_name}: {stages.summary()}")
+            else:
+                self.report({'WARNING'}, f"{action_name} failed: {error} ({stages.summary()})")
+            if log_path:
+                append_stage_log(log_path, stages.record(operator=self.bl_idname, file=action_name, error=error))
+        if exported:
+            save_export_manifest(export_dir, manifest)
+
+        skipped = len(actions) - len(pending) - len(rejected)
+        elapsed = time.perf_counter() - start_time
+        self.report(
+            {'INFO'},
+            f"Exported {exported} of {len(pending)} changed actions, skipped {skipped} unchanged, in {elapsed:.2f}s.",
+        )
+        return {'FINISHED'} if exported or skipped else {'CANCELLED'}
+
+
+def prepare_actions(context, armature, actions, use_direct_sampler, tolerances, collada_dir, progress=None):
+    """Sample each action, or run Blender's COLLADA exporter on it, over the action's own frame range.
+
+    Returns (action name, SampledAnimation or DAE path, stages, error) per
+    action, a failed action does not stop the others. Exported DAEs go into
+    collada_dir, named by their index. The armature's action and the scene
+    frame range are put back afterwards.
+    """
+    scene = context.scene
+    animation_data = armature.animation_data or armature.animation_data_create()
+    original_action = animation_data.action
+    original_range = (scene.frame_start, scene.frame_end)
+    prepared_actions = []
+    try:
+        for index, action in enumerate(actions):
+            stages = StageRecorder()
+            source = None
+            error = None
+            try:
+                animation_data.action = action
+                frame_start, frame_end = action_frame_range(action)
+                if use_direct_sampler:
+                    with stages.stage('sample'):
+                        source = sample_animation(context, armature, frame_start, frame_end, tolerances)
+                else:
+                    #the exporter covers the scene range and always writes animation.dae, so rename each one
+                    scene.frame_start, scene.frame_end = frame_start, frame_end
+                    with stages.stage('export_dae'):
+                        dae_model_path = export_collada_skeleton(context, armature, collada_dir)
+                    if not dae_model_path:
+                        raise Exception("Failed to export DAE.")
+                    source = os.path.join(collada_dir, f"{index:05d}.dae")
+                    os.replace(dae_model_path, source)
+            except Exception as e:
+                error = str(e)
+            prepared_actions.append((action.name, source, stages, error))
+            if progress:
+                progress()
+    finally:
+        animation_data.action = original_action
+        scene.frame_start, scene.frame_end = original_range
+    return prepared_actions
+
+def action_frame_range(action):
+    frame_start, frame_end = action.frame_range
+    return int(round(frame_start)), int(round(frame_end))
+
+def finish_actions(prepared_actions, export_paths, compression_level, scratch_dir, pool, progress=None):
+    """Write, convert and compress prepared actions, converting all of them in one Divine run.
+
+    Sampled actions are written to scratch_dir/<index>.dae next to the ones
+    prepare_actions exported. Returns the error of each action, None when it
+    was exported.
+    """
+    errors = [error for _, _, _, error in prepared_actions]
+    dae_paths = {}
+
+    def write_dae(index):
+        _, source, stages, _ = prepared_actions[index]
+        if not isinstance(source, SampledAnimation):
+            return source
+        with stages.stage('export_dae'):
+            return write_sampled_animation(source, os.path.join(scratch_dir, f"{index:05d}.dae"))
+
+    ready = [index for index, error in enumerate(errors) if error is None]
+    for index, result in zip(ready, pool.map(lambda index: run_safe(write_dae, index), ready)):
+        dae_model_path, errors[index] = result
+        if errors[index] is None:
+            dae_paths[index] = dae_model_path
+
+    #the GR2s go to scratch_dir/gr2/<index>.gr2 and are matched back by that name
+    gr2_dir = os.path.join(scratch_dir, "gr2")
+    os.makedirs(gr2_dir, exist_ok=True)
+    convert_start = time.perf_counter()
+    conversions = convert_models(list(dae_paths.values()), "gr2", gr2_dir) if dae_paths else {}
+    convert_time = time.perf_counter() - convert_start
+
+    def compress(index):
+        _, _, stages, _ = prepared_actions[index]
+        stages.add('convert', convert_time)
+        gr2_model_path, error = conversions[dae_paths[index]]
+        if error:
+            raise Exception(f"Failed to convert DAE to GR2: {error}")
+        with stages.stage('compress'):
+            compress_gr2(gr2_model_path, export_paths[index], compression_level)
+
+    futures = {pool.submit(run_safe, compress, index): index for index in dae_paths}
+    #actions that already failed count as finished
+    for index in range(len(errors)):
+        if index not in dae_paths and progress:
+            progress()
+    for future in as_completed(futures):
+        _, errors[futures[future]] = future.result()
+        if progress:
+            progress()
+    return errors
+
+def run_safe(function, *args):
+    try:
+        return function(*args), None
+    except Exception as e:
+        return None, str(e)
+
+def build_hades_model(context, model, stages=None):
+    stages = stages or StageRecorder()
+
+    with stages.stage('skeleton'):
+        armature = import_collada_skeleton(context, model=model)
+    if not isinstance(armature, bpy.types.Object):
+        raise Exception("Failed to import skeleton.")
+
+    import_collada_meshes(context, None, armature, model=model, stages=stages)
+
+    armature.rotation_euler = (math.radians(90), 0, 0)
+    return armature
+
+def key_reduction_summary(dae_model_path, kept_keys, sampled_keys):
+    dropped_keys = sampled_keys - kept_keys
+    #estimate what the dropped keys would have cost from the size of the keys that were written
+    saved_bytes = os.path.getsize(dae_model_path) * dropped_keys / max(kept_keys, 1)
+    percent = 100 * dropped_keys / max(sampled_keys, 1)
+    return f"Dropped {dropped_keys} of {sampled_keys} keys ({percent:.1f}%), about {saved_bytes / 1024:.0f} KB less DAE."
+
+def select_export_armature(context):
+    """The active armature, or else the first one in the file, made the only selected object"""
+    if context.active_object and context.active_object.type == 'ARMATURE':
+        armature = context.active_object
+    else:
+        armature = next((obj for obj in bpy.data.objects if obj.type == 'ARMATURE'), None)
+
+    if armature:
+        bpy.ops.object.select_all(action='DESELECT')
+        armature.select_set(True)
+        context.view_layer.objects.active = armature
+    return armature
+
+def get_preferences(context):
+    return context.preferences.addons[__package__].preferences
+
+def instrumentation_settings(preferences):
+    """Stage log path, memory tracing and profile folder, the environment wins over the preferences"""
+    log_path = os.environ.get(STAGE_LOG_ENV) or bpy.path.abspath(preferences.stage_log_path)
+    trace_memory = os.environ.get(TRACE_MEMORY_ENV, "") not in ("", "0") or preferences.trace_memory
+    profile_dir = os.environ.get(PROFILE_DIR_ENV) or bpy.path.abspath(preferences.profile_dir)
+    return log_path, trace_memory, profile_dir
+
+def apply_pipeline_preferences(preferences):
+    """Scratch and cache settings, the environment wins over the preferences"""
+    scratch_workspace.keep = os.environ.get(KEEP_SCRATCH_ENV, "") not in ("", "0") or preferences.keep_scratch_files
+    if not os.environ.get(CACHE_SIZE_ENV):
+        dae_cache.max_size = model_cache.max_size = preferences.cache_size_mb * 1024 * 1024
+
+@contextmanager
+def suspend_undo(context):
+    """Keep a batch from recording undo steps for each model it builds"""
+    edit_prefs = context.preferences.edit
+    use_global_undo = edit_prefs.use_global_undo
+    edit_prefs.use_global_undo = False
+    try:
+        yield
+    finally:
+        edit_prefs.use_global_undo = use_global_undo
+
+
+def menu_func_import(self, context):
+    """Add the importer to the File > Import menu"""
+    self.layout.operator(ImportHadesFile.bl_idname, text="Hades II Model (.lz4)")
+    self.layout.operator(ImportHadesFiles.bl_idname, text="Hades II Models, Batch (.lz4)")
+
+def menu_func_export(self, context):
+    """Add the exporter to the File > Export menu"""
+    self.layout.operator(ExportHadesAnimation.bl_idname, text="Hades II Animation (.lz4)")
+    self.layout.operator(ExportHadesAnimations.bl_idname, text="Hades II Animations, Batch (.lz4)")
+
+
+classes = [
+    HadesAddonPreferences, ImportHadesFile, ImportHadesFiles, ExportHadesAnimation, ActionExportItem,
+    ExportHadesAnimations,
+]
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
+
+
+def unregister():
+    for cls in classes:
+        bpy.utils.unregister_class(cls)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
+    scratch_workspace.cleanup()
+
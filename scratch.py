@@ -0,0 +1,82 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+SCRATCH_DIR_ENV = "HADES2_SCRATCH_DIR"
+KEEP_SCRATCH_ENV = "HADES2_KEEP_SCRATCH"
+
+# RAM-backed folders tried before the regular temp folder
+RAM_DISK_DIRS = ["/dev/shm"]
+# Free space left on the RAM disk after a stage's expected size
+RAM_DISK_RESERVE = 512 * 1024 * 1024
+
+
+class ScratchWorkspace:
+    """Per-session home for intermediate files.
+
+    Each pipeline stage gets its own folder inside the session folder, and
+    the stage folder is deleted when the stage ends, whether it succeeded or
+    not. Stages go to a RAM disk when one exists with enough free space.
+    The session folders are deleted at exit. keep leaves everything on
+    disk for debugging.
+    """
+
+    def __init__(self, root=None, keep=None):
+        self.root = root or os.environ.get(SCRATCH_DIR_ENV) or None
+        self.keep = keep if keep is not None else os.environ.get(KEEP_SCRATCH_ENV, "") not in ("", "0")
+        self.session_dirs = {}
+        self.lock = threading.Lock()
+
+    def base_dir(self, size_hint=0):
+        if self.root:
+            return self.root
+        for ram_dir in RAM_DISK_DIRS:
+            try:
+                if os.access(ram_dir, os.W_OK) and shutil.disk_usage(ram_dir).free >= size_hint + RAM_DISK_RESERVE:
+                    return ram_dir
+            except OSError:
+                continue
+        return tempfile.gettempdir()
+
+    def session_dir(self, size_hint=0):
+        base_dir = self.base_dir(size_hint)
+        with self.lock:
+            session_dir = self.session_dirs.get(base_dir)
+            if session_dir is None or not os.path.isdir(session_dir):
+                os.makedirs(base_dir, exist_ok=True)
+                session_dir = tempfile.mkdtemp(prefix=f"hades2_{os.getpid()}_", dir=base_dir)
+                self.session_dirs[base_dir] = session_dir
+            return session_dir
+
+    @contextmanager
+    def stage(self, name, size_hint=0):
+        """A fresh folder for one stage, removed again when the block exits"""
+        stage_dir = tempfile.mkdtemp(prefix=f"{name}_", dir=self.session_dir(size_hint))
+        try:
+            yield stage_dir
+        finally:
+            if self.keep:
+                print(f"Keeping scratch files in {stage_dir}")
+            else:
+                shutil.rmtree(stage_dir, ignore_errors=True)
+
+    def new_file(self, suffix="", size_hint=0):
+        """A path for a file that outlives its stage, it goes away with the session"""
+        handle, path = tempfile.mkstemp(suffix=suffix, dir=self.session_dir(size_hint))
+        os.close(handle)
+        return path
+
+    def cleanup(self):
+        with self.lock:
+            session_dirs = list(self.session_dirs.values())
+            self.session_dirs.clear()
+        if self.keep:
+            return
+        for session_dir in session_dirs:
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+scratch_workspace = ScratchWorkspace()
+atexit.register(scratch_workspace.cleanup)
@@ -1,146 +1,208 @@
-import bpy
-import xml.etree.ElementTree as ET
-from mathutils import Matrix, Vector, Euler
-import tempfile
-
-
-def import_collada_skeleton(context, filepath):
-    empties = {}
-    try:
-        tree = ET.parse(filepath)
-        root = tree.getroot()
-        namespace = {'collada': root.tag.split('}')[0].strip('{')}
-        print(f"Namespace detected: {namespace}")
-
-        visual_scene = root.find(".//collada:library_visual_scenes/collada:visual_scene", namespace)
-        if not visual_scene:
-            print({'ERROR'}, "No skeleton found in the COLLADA file.")
-            return {'CANCELLED'}
-
-        import_hierarchy(visual_scene, namespace, empties, None)
-
-        armature_object = create_armature(context, empties)
-
-        cleanup_scene(context, armature_object, empties)
-
-    except Exception as e:
-        print({'ERROR'}, f"Failed to parse COLLADA file: {e}")
-        print(f"Error: {e}")
-        return {'CANCELLED'}
-
-    print({'INFO'}, "Skeleton imported as empties and armature.")
-    print("Import completed successfully.")
-    return armature_object
-
-
-def import_hierarchy(node, namespace, empties, parent_empty):
-    for child_node in node.findall("collada:node", namespace):
-        if child_node.get("type") == "JOINT":
-            empty_object = create_empty_from_joint(child_node, namespace)
-            if parent_empty:
-                empty_object.parent = parent_empty
-
-            empties[empty_object.name] = empty_object
-
-            import_hierarchy(child_node, namespace, empties, empty_object)
-
-
-def create_empty_from_joint(node, namespace):
-    name = node.get("name", "Unnamed")
-    matrix_element = node.find("collada:matrix", namespace)
-    transform_matrix = Matrix.Identity(4)  # Default to identity matrix if not found
-
-    if matrix_element is not None:
-        matrix_values = list(map(float, matrix_element.text.split()))
-        transform_matrix = Matrix([matrix_values[i:i + 4] for i in range(0, 16, 4)])
-
-    empty = bpy.data.objects.new(name, None)
-    empty.matrix_world = transform_matrix
-    bpy.context.collection.objects.link(empty)
-    return empty
-
-def create_armature(context, empties):
-    armature = bpy.data.armatures.new("Armature")
-    armature_object = bpy.data.objects.new("Armature", armature)
-    bpy.context.collection.objects.link(armature_object)
-    bpy.context.view_layer.objects.active = armature_object
-    bpy.ops.object.mode_set(mode='EDIT')
-
-    edit_bones = armature.edit_bones
-    for empty_name, empty in empties.items():
-        bone = edit_bones.new(empty_name)
-        bone.head = empty.matrix_world.translation
-        boneLength = 5
-
-        local_tail = Vector((0, boneLength, 0))
-        if empty.parent:
-            parent_matrix = empty.matrix_world.to_3x3()  # Only rotation part
-            rotated_tail = parent_matrix @ local_tail
-            bone.tail = empty.matrix_world.translation + rotated_tail
-        else:
-            bone.tail = bone.head + local_tail
-
-        if empty.parent and empty.parent.name in edit_bones:
-            bone.parent = edit_bones[empty.parent.name]
-        
-        local_matrix = empty.matrix_world
-        loc, rot, sca = local_matrix.decompose()
-        local_x = rot @ Vector((0, 0, 1))
-        bone.align_roll(local_x)
-
-    bpy.ops.object.mode_set(mode='OBJECT')
-    return armature_object
-
-def cleanup_scene(context, armature_object, empties):
-
-    for empty_name, empty in empties.items():
-        bpy.data.objects.remove(empty, do_unlink=True)
-
-    context.scene.render.fps = 60
-    armature_object.data.relation_line_position = 'HEAD'
-
-
-def export_collada_skeleton(context, armature):
-    if bpy.context.view_layer.objects.active and bpy.context.view_layer.objects.active.type == 'ARMATURE':
-        temp_file = tempfile.NamedTemporaryFile(suffix=".dae", delete=False)
-        temp_filepath = temp_file.name
-        temp_file.close()
-
-        bpy.ops.wm.collada_export(
-            filepath = temp_filepath,
-            apply_modifiers = False,
-            export_mesh_type = 0,
-            export_mesh_type_selection = 'view',
-            export_global_forward_selection = 'Y',
-            export_global_up_selection = 'Z',
-            apply_global_orientation = False,
-            selected = True,
-            include_children = False,
-            include_armatures = False,
-            include_shapekeys = False,
-            deform_bones_only = False,
-            include_animations = True,
-            include_all_actions = False,
-            export_animation_type_selection = 'sample',
-            sampling_rate = 1,
-            keep_smooth_curves = False,
-            keep_keyframes = False,
-            keep_flat_curves = False,
-            active_uv_only = False,
-            use_texture_copies = True,
-            triangulate = True,
-            use_object_instantiation = True,
-            use_blender_profile = True,
-            sort_by_name = False,
-            export_object_transformation_type = 0,
-            export_object_transformation_type_selection = 'matrix',
-            export_animation_transformation_type = 0,
-            export_animation_transformation_type_selection = 'matrix',
-            open_sim = False,
-            limit_precision = False,
-            keep_bind_info = False
-        )
-        print(f"Armature exported to {temp_filepath}")
-        return temp_filepath
-    else:
-        print("No armature is selected or active.")
\ No newline at end of file
+import bpy
+from mathutils import Matrix, Vector, Euler
+import os
+from collections import namedtuple
+from .collada_reader import read_collada
+from .collada_writer import write_animation_collada
+from .animation_sampler import sample_armature_animation
+from .keyframe_reduction import reduce_keys
+from .scratch import scratch_workspace
+
+SampledAnimation = namedtuple(
+    'SampledAnimation',
+    ['armature_name', 'action_name', 'object_matrix', 'joints', 'times', 'poses', 'key_mask', 'scene_name'],
+)
+
+
+def import_collada_skeleton(context, filepath=None, model=None):
+    try:
+        if model is None:
+            model = read_collada(filepath)
+
+        if not model.has_visual_scene:
+            print({'ERROR'}, "No skeleton found in the COLLADA file.")
+            return {'CANCELLED'}
+
+        world_matrices = compose_joint_matrices(model.joints)
+
+        armature_object = create_armature(context, model.joints, world_matrices)
+
+        cleanup_scene(context, armature_object)
+
+    except Exception as e:
+        print({'ERROR'}, f"Failed to parse COLLADA file: {e}")
+        print(f"Error: {e}")
+        return {'CANCELLED'}
+
+    print({'INFO'}, "Skeleton imported as armature.")
+    print("Import completed successfully.")
+    return armature_object
+
+
+def compose_joint_matrices(joints):
+    # Joints come parents first, so each world matrix builds on its parent's
+    world_matrices = []
+    for name, parent_index, matrix_values in joints:
+        local_matrix = Matrix.Identity(4)  # Default to identity matrix if not found
+        if matrix_values is not None:
+            local_matrix = Matrix([matrix_values[i:i + 4] for i in range(0, 16, 4)])
+
+        if parent_index >= 0:
+            world_matrices.append(world_matrices[parent_index] @ local_matrix)
+        else:
+            world_matrices.append(local_matrix)
+    return world_matrices
+
+def create_armature(context, joints, world_matrices):
+    armature = bpy.data.armatures.new("Armature")
+    armature_object = bpy.data.objects.new("Armature", armature)
+    bpy.context.collection.objects.link(armature_object)
+    bpy.context.view_layer.objects.active = armature_object
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    edit_bones = armature.edit_bones
+    bones = []
+    for (name, parent_index, _), world_matrix in zip(joints, world_matrices):
+        bone = edit_bones.new(name)
+        bone.head = world_matrix.translation
+        boneLength = 5
+
+        local_tail = Vector((0, boneLength, 0))
+        if parent_index >= 0:
+            parent_matrix = world_matrix.to_3x3()  # Only rotation part
+            rotated_tail = parent_matrix @ local_tail
+            bone.tail = world_matrix.translation + rotated_tail
+        else:
+            bone.tail = bone.head + local_tail
+
+        if parent_index >= 0:
+            bone.parent = bones[parent_index]
+
+        loc, rot, sca = world_matrix.decompose()
+        local_x = rot @ Vector((0, 0, 1))
+        bone.align_roll(local_x)
+        bones.append(bone)
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return armature_object
+
+def cleanup_scene(context, armature_object):
+    context.scene.render.fps = 60
+    armature_object.data.relation_line_position = 'HEAD'
+
+
+def export_collada_skeleton(context, armature, output_dir=None):
+    if bpy.context.view_layer.objects.active and bpy.context.view_layer.objects.active.type == 'ARMATURE':
+        temp_filepath = scratch_dae_path(output_dir)
+
+        bpy.ops.wm.collada_export(
+            filepath = temp_filepath,
+            apply_modifiers = False,
+            export_mesh_type = 0,
+            export_mesh_type_selection = 'view',
+            export_global_forward_selection = 'Y',
+            export_global_up_selection = 'Z',
+            apply_global_orientation = False,
+            selected = True,
+            include_children = False,
+            include_armatures = False,
+            include_shapekeys = False,
+            deform_bones_only = False,
+            include_animations = True,
+            include_all_actions = False,
+            export_animation_type_selection = 'sample',
+            sampling_rate = 1,
+            keep_smooth_curves = False,
+            keep_keyframes = False,
+            keep_flat_curves = False,
+            active_uv_only = False,
+            use_texture_copies = True,
+            triangulate = True,
+            use_object_instantiation = True,
+            use_blender_profile = True,
+            sort_by_name = False,
+            export_object_transformation_type = 0,
+            export_object_transformation_type_selection = 'matrix',
+            export_animation_transformation_type = 0,
+            export_animation_transformation_type_selection = 'matrix',
+            open_sim = False,
+            limit_precision = False,
+            keep_bind_info = False
+        )
+        print(f"Armature exported to {temp_filepath}")
+        return temp_filepath
+    else:
+        print("No armature is selected or active.")
+
+
+def export_sampled_animation(context, armature, tolerances=None, output_dir=None):
+    """Write the armature's joints and animation straight from sampled pose matrices.
+
+    Covers the same frames and matrices as export_collada_skeleton without
+    running the full COLLADA exporter over the scene. With (location,
+    rotation, scale) tolerances, keys that linear interpolation recovers are
+    dropped. Returns the DAE path and (kept keys, sampled keys).
+    """
+    if armature is None or armature.type != 'ARMATURE':
+        print("No armature is selected or active.")
+        return None, None
+
+    scene = context.scene
+    sampled = sample_animation(context, armature, scene.frame_start, scene.frame_end, tolerances)
+    return write_sampled_animation(sampled, scratch_dae_path(output_dir)), sampled_key_counts(sampled)
+
+
+def sample_animation(context, armature, frame_start, frame_end, tolerances=None):
+    """Sample the armature's current action over the frame range, this has to run on the main thread"""
+    scene = context.scene
+    names, parents, rest, times, poses = sample_armature_animation(scene, armature, frame_start, frame_end)
+    joints = [
+        (name, int(parent_index), rest_matrix.ravel().tolist())
+        for name, parent_index, rest_matrix in zip(names, parents, rest)
+    ]
+    key_mask = reduce_keys(times, poses, *tolerances) if tolerances is not None else None
+
+    action = armature.animation_data.action if armature.animation_data else None
+    return SampledAnimation(
+        armature.name,
+        action.name if action else armature.name,
+        [list(row) for row in armature.matrix_world],
+        joints,
+        times,
+        poses,
+        key_mask,
+        scene.name,
+    )
+
+
+def sampled_key_counts(sampled):
+    sampled_keys = sampled.poses.shape[0] * sampled.poses.shape[1]
+    kept_keys = int(sampled.key_mask.sum()) if sampled.key_mask is not None else sampled_keys
+    return kept_keys, sampled_keys
+
+
+def write_sampled_animation(sampled, dae_path=None):
+    """Write a sampled animation to dae_path or a scratch file, safe to call from worker threads"""
+    if dae_path is None:
+        dae_path = scratch_dae_path()
+
+    write_animation_collada(
+        dae_path,
+        sampled.armature_name,
+        sampled.action_name,
+        sampled.object_matrix,
+        sampled.joints,
+        sampled.times,
+        sampled.poses,
+        scene_name=sampled.scene_name,
+        key_mask=sampled.key_mask,
+    )
+    print(f"Animation sampled to {dae_path}")
+    return dae_path
+
+
+def scratch_dae_path(output_dir=None):
+    # A stage folder is removed with its stage, a bare scratch file lasts the session
+    if output_dir:
+        return os.path.join(output_dir, "animation.dae")
+    return scratch_workspace.new_file(".dae")
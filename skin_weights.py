@@ -0,0 +1,96 @@
+import numpy as np
+
+# Hades II vertex formats carry four bone indices per vertex
+MAX_INFLUENCES = 4
+
+
+class SkinWeights:
+    """Per-vertex joint influences stored as CSR arrays.
+
+    The influences of vertex i are joints[offsets[i]:offsets[i + 1]] with the
+    matching weights. Every operation returns a new SkinWeights.
+    """
+
+    def __init__(self, joint_names, offsets, joints, weights):
+        self.joint_names = joint_names
+        self.offsets = offsets
+        self.joints = joints
+        self.weights = weights
+
+    @classmethod
+    def from_collada(cls, joint_names, weights, vcount, v):
+        """Build from a <vertex_weights> element's arrays, dropping broken references"""
+        influence_count = min(int(vcount.sum()), len(v) // 2)
+        influences = v[:influence_count * 2].reshape(-1, 2)
+        joint_idx = influences[:, 0]
+        weight_idx = influences[:, 1]
+
+        vertex_idx = np.repeat(np.arange(len(vcount), dtype=np.int32), vcount)[:influence_count]
+        valid = (joint_idx >= 0) & (joint_idx < len(joint_names)) & (weight_idx >= 0) & (weight_idx < len(weights))
+
+        return cls.from_influences(
+            joint_names,
+            len(vcount),
+            vertex_idx[valid],
+            joint_idx[valid],
+            weights[weight_idx[valid]],
+        )
+
+    @classmethod
+    def from_influences(cls, joint_names, vertex_count, vertex_idx, joints, weights):
+        """Build from parallel per-influence arrays already grouped by vertex"""
+        offsets = np.zeros(vertex_count + 1, dtype=np.int32)
+        np.cumsum(np.bincount(vertex_idx, minlength=vertex_count), out=offsets[1:])
+        return cls(
+            joint_names,
+            offsets,
+            np.asarray(joints, dtype=np.int32),
+            np.asarray(weights, dtype=np.float32),
+        )
+
+    @property
+    def vertex_count(self):
+        return len(self.offsets) - 1
+
+    def influence_counts(self):
+        return np.diff(self.offsets)
+
+    def influence_vertices(self):
+        """Vertex index of every influence"""
+        return np.repeat(np.arange(self.vertex_count, dtype=np.int32), self.influence_counts())
+
+    def normalized(self):
+        """Scale each vertex's weights to sum to one, vertices without weight are left alone"""
+        vertex_idx = self.influence_vertices()
+        totals = np.bincount(vertex_idx, weights=self.weights, minlength=self.vertex_count)
+        totals = totals[vertex_idx]
+        weights = np.divide(self.weights, totals, out=self.weights.astype(np.float64), where=totals > 0)
+        return SkinWeights(self.joint_names, self.offsets, self.joints, weights.astype(np.float32))
+
+    def limited(self, max_influences=MAX_INFLUENCES):
+        """Keep only the strongest max_influences influences of each vertex"""
+        if len(self.joints) == 0 or self.influence_counts().max() <= max_influences:
+            return self
+
+        vertex_idx = self.influence_vertices()
+        # Strongest first within each vertex, ties keep their original order
+        order = np.lexsort((-self.weights, vertex_idx))
+        rank = np.arange(len(order)) - self.offsets[vertex_idx[order]]
+        kept = np.sort(order[rank < max_influences])
+        return self.subset(vertex_idx, kept)
+
+    def without_zero_weights(self, threshold=0.0):
+        """Drop influences whose weight is at or below threshold"""
+        kept = np.flatnonzero(self.weights > threshold)
+        if len(kept) == len(self.weights):
+            return self
+        return self.subset(self.influence_vertices(), kept)
+
+    def subset(self, vertex_idx, kept):
+        return SkinWeights.from_influences(
+            self.joint_names,
+            self.vertex_count,
+            vertex_idx[kept],
+            self.joints[kept],
+            self.weights[kept],
+        )
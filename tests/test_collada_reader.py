@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from hades2_blender_utility.collada_reader import parse_array, dedupe_corners, build_position_map, gather_rows
+
+
+def reference_dedupe(corners):
+    # The per-corner dict loop the vectorized pass replaced
+    vertex_map = {}
+    vertex_keys = []
+    corner_verts = []
+    pos_map = {}
+    for key in map(tuple, corners.tolist()):
+        if key not in vertex_map:
+            vertex_map[key] = len(vertex_keys)
+            vertex_keys.append(key)
+        corner_verts.append(vertex_map[key])
+        pos_map.setdefault(key[0], []).append(vertex_map[key])
+    return vertex_keys, corner_verts, pos_map
+
+
+def synthetic_p(triangle_count, index_range, seed):
+    # Small index ranges make many corners repeat, as in a real mesh
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(index_range[0], index_range[1], size=triangle_count * 3 * 3)
+    return " ".join(map(str, indices.tolist()))
+
+
+@pytest.mark.parametrize("triangle_count, index_range", [
+    (0, (0, 1)),
+    (1, (0, 1)),
+    (500, (0, 8)),
+    (2000, (0, 200)),
+    (300, (-3, 5)),           # negative indices skip the packed path
+    (300, (0, 2 ** 31 - 1)),  # so do indices too large to pack
+])
+def test_dedupe_matches_per_corner_loop(triangle_count, index_range):
+    corners = parse_array(synthetic_p(triangle_count, index_range, triangle_count), np.int32).reshape(-1, 3)
+
+    vertex_keys, corner_verts = dedupe_corners(corners)
+    expected_keys, expected_verts, _ = reference_dedupe(corners)
+
+    assert vertex_keys.tolist() == [list(key) for key in expected_keys]
+    assert corner_verts.tolist() == expected_verts
+    assert corner_verts.dtype == np.int32
+
+
+@pytest.mark.parametrize("triangle_count, index_range, position_count", [
+    (0, (0, 1), 4),
+    (500, (0, 8), 12),
+    (2000, (0, 200), 150),  # positions past position_count still get a row
+    (300, (-3, 5), 5),      # negative positions are left out of the map
+])
+def test_position_map_matches_per_corner_loop(triangle_count, index_range, position_count):
+    corners = parse_array(synthetic_p(triangle_count, index_range, triangle_count), np.int32).reshape(-1, 3)
+
+    vertex_keys, _ = dedupe_corners(corners)
+    offsets, vertices = build_position_map(vertex_keys[:, 0], position_count)
+    _, _, expected_pos_map = reference_dedupe(corners)
+
+    assert len(offsets) - 1 == max(position_count, max(expected_pos_map, default=-1) + 1)
+    for position in range(len(offsets) - 1):
+        # The loop appended once per corner, the map keeps each vertex once
+        expected = list(dict.fromkeys(expected_pos_map.get(position, [])))
+        assert vertices[offsets[position]:offsets[position + 1]].tolist() == expected
+    assert len(vertices) == int((vertex_keys[:, 0] >= 0).sum())
+
+
+def test_gather_rows_defaults_bad_indices():
+    values = np.arange(6, dtype=np.float32).reshape(3, 2)
+    indices = np.array([0, 2, 3, -1, -4], dtype=np.int32)
+
+    rows = gather_rows(values, indices, (9.0, 9.0))
+
+    assert rows.tolist() == [[0, 1], [4, 5], [9, 9], [9, 9], [9, 9]]
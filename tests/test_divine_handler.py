@@ -0,0 +1,181 @@
+import os
+import stat
+import sys
+import pytest
+from hades2_blender_utility import divine_handler, model_loader
+from hades2_blender_utility.divine_handler import DaeCache, convert_models, gr2_data_to_dae_batch
+from hades2_blender_utility.lz4_handler import compress_lz4_data
+from hades2_blender_utility.model_cache import ModelCache
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="the stub Divine is a script with a shebang")
+
+# Copies every input to its output, logging the action of each run, and fails on inputs containing BAD
+STUB_DIVINE = '''#!{python}
+import os, sys
+args = sys.argv[1:]
+options = dict(zip(args[0::2], args[1::2]))
+with open(os.environ['STUB_DIVINE_LOG'], 'a') as log:
+    log.write(options['-a'] + '\\n')
+
+def convert(source, destination):
+    with open(source, 'rb') as file:
+        data = file.read()
+    if b'BAD' in data:
+        sys.stderr.write('cannot convert ' + source + '\\n')
+        sys.exit(3)
+    with open(destination, 'wb') as file:
+        file.write(data)
+
+if options['-a'] == 'convert-models':
+    for name in sorted(os.listdir(options['-s'])):
+        stem = os.path.splitext(name)[0]
+        convert(os.path.join(options['-s'], name), os.path.join(options['-d'], stem + '.' + options['--output-format']))
+else:
+    convert(options['-s'], options['-d'])
+'''
+
+
+@pytest.fixture
+def divine_runs(tmp_path, monkeypatch):
+    """Point HADES2_DIVINE_PATH at the stub, returns a function listing the actions it ran"""
+    stub_path = tmp_path / "divine"
+    stub_path.write_text(STUB_DIVINE.format(python=sys.executable))
+    stub_path.chmod(stub_path.stat().st_mode | stat.S_IEXEC)
+    log_path = tmp_path / "divine.log"
+    log_path.write_text("")
+    monkeypatch.setenv("HADES2_DIVINE_PATH", str(stub_path))
+    monkeypatch.setenv("STUB_DIVINE_LOG", str(log_path))
+    monkeypatch.setattr(divine_handler, "dae_cache", DaeCache(str(tmp_path / "dae_cache")))
+    return lambda: log_path.read_text().split()
+
+def write_inputs(tmp_path, contents, extension="gr2"):
+    # Inputs in separate folders with distinct names
+    paths = []
+    for index, data in enumerate(contents):
+        folder = tmp_path / f"in{index}"
+        folder.mkdir()
+        path = folder / f"model{index}.{extension}"
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths
+
+def small_dae(joint_name):
+    return (
+        '<?xml version="1.0"?><COLLADA xmlns="http://www.collada.org/2005/11/COLLADASchema" version="1.4.1">'
+        '<library_visual_scenes><visual_scene id="Scene">'
+        f'<node id="{joint_name}" name="{joint_name}" sid="{joint_name}" type="JOINT">'
+        '<matrix sid="transform">1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1</matrix></node>'
+        '</visual_scene></library_visual_scenes></COLLADA>'
+    ).encode()
+
+
+def test_batch_converts_in_one_run(tmp_path, divine_runs):
+    inputs = write_inputs(tmp_path, [b"first", b"second", b"third"])
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    results = convert_models(inputs, "dae", str(output_dir))
+
+    assert divine_runs() == ["convert-models"]
+    for input_file, data in zip(inputs, [b"first", b"second", b"third"]):
+        output_file, error = results[input_file]
+        assert error is None
+        assert output_file == os.path.join(str(output_dir), os.path.basename(input_file)[:-4] + ".dae")
+        with open(output_file, 'rb') as file:
+            assert file.read() == data
+
+def test_outputs_go_next_to_inputs_without_output_dir(tmp_path, divine_runs):
+    inputs = write_inputs(tmp_path, [b"a", b"b"], "dae")
+    results = convert_models(inputs, "gr2")
+    for input_file in inputs:
+        assert results[input_file] == (input_file[:-4] + ".gr2", None)
+
+def test_failed_batch_falls_back_to_single_files(tmp_path, divine_runs):
+    inputs = write_inputs(tmp_path, [b"good", b"BAD", b"fine"])
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    results = convert_models(inputs, "dae", str(output_dir))
+
+    assert divine_runs() == ["convert-models"] + ["convert-model"] * 3
+    assert results[inputs[0]].error is None and results[inputs[2]].error is None
+    assert results[inputs[1]].output_file is None
+    assert "cannot convert" in results[inputs[1]].error
+    with open(results[inputs[2]].output_file, 'rb') as file:
+        assert file.read() == b"fine"
+
+def test_bad_inputs_get_their_own_errors(tmp_path, divine_runs):
+    inputs = write_inputs(tmp_path, [b"a", b"b"])
+    clash = tmp_path / "other" / os.path.basename(inputs[0])
+    clash.parent.mkdir()
+    clash.write_bytes(b"c")
+    missing = str(tmp_path / "missing.gr2")
+    wrong_format = str(tmp_path / "in0" / "notes.txt")
+    with open(wrong_format, 'w') as file:
+        file.write("x")
+
+    results = convert_models(inputs + [str(clash), missing, wrong_format], "dae", str(tmp_path))
+
+    assert divine_runs() == ["convert-models"]
+    assert results[inputs[0]].error is None and results[inputs[1]].error is None
+    assert "would overwrite" in results[str(clash)].error
+    assert "not found" in results[missing].error
+    assert "is not a .gr2 file" in results[wrong_format].error
+
+def test_gr2_data_batch_keeps_order_and_uses_the_cache(divine_runs):
+    gr2_datas = [b"one", b"two", b"BAD", b"one"]
+
+    results = gr2_data_to_dae_batch(gr2_datas)
+    assert [dae_data for dae_data, _ in results] == [b"one", b"two", None, b"one"]
+    assert "cannot convert" in results[2][1]
+    assert divine_runs().count("convert-models") == 1
+
+    runs = len(divine_runs())
+    assert gr2_data_to_dae_batch([b"two", b"one"]) == [(b"two", None), (b"one", None)]
+    assert len(divine_runs()) == runs
+
+def test_prepare_models_converts_all_files_in_one_run(tmp_path, divine_runs, monkeypatch):
+    monkeypatch.setattr(model_loader, "model_cache", ModelCache(str(tmp_path / "model_cache")))
+    lz4_paths = write_inputs(
+        tmp_path, [bytes(compress_lz4_data(small_dae(name))) for name in ("Root", "Hips", "Spine")], "lz4"
+    )
+    broken = tmp_path / "broken.lz4"
+    broken.write_bytes(b"\x00\x05\x00")
+
+    results = model_loader.prepare_hades_models(lz4_paths + [str(broken)], use_cache=True)
+
+    assert divine_runs() == ["convert-models"]
+    assert [model.joints[0][0] for model, _, _ in results[:3]] == ["Root", "Hips", "Spine"]
+    assert all(error is None and 'convert' in stages.timings for _, stages, error in results[:3])
+    assert results[3][0] is None and results[3][2]
+
+    # The second run is answered by the model cache without starting Divine
+    records = model_loader.preprocess_hades_models(lz4_paths)
+    assert [record['cached'] for record in records] == [True, True, True]
+    assert divine_runs() == ["convert-models"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, divine_handler.DEFAULT_CACHE_SIZE),
+    ("512", 512 * 1024 * 1024),
+    ("0", 0),
+    ("lots", divine_handler.DEFAULT_CACHE_SIZE),
+])
+def test_cache_size_comes_from_the_environment(tmp_path, monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv(divine_handler.CACHE_SIZE_ENV, raising=False)
+    else:
+        monkeypatch.setenv(divine_handler.CACHE_SIZE_ENV, value)
+
+    assert DaeCache(str(tmp_path)).max_size == expected
+    assert ModelCache(str(tmp_path)).max_size == expected
+    assert DaeCache(str(tmp_path), max_size=10).max_size == 10
+
+def test_cache_evicts_down_to_its_size(tmp_path):
+    cache = DaeCache(str(tmp_path), max_size=250)
+    for index in range(3):
+        cache.put(f"key{index}", bytes(100))
+        os.utime(cache.path(f"key{index}"), (index, index))
+    cache.evict()
+
+    assert [cache.get(f"key{index}") is not None for index in range(3)] == [False, True, True]
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from hades2_blender_utility.keyframe_reduction import (
+    decompose_matrices, make_continuous, reduce_keys,
+    DEFAULT_LOCATION_TOLERANCE, DEFAULT_ROTATION_TOLERANCE, DEFAULT_SCALE_TOLERANCE,
+)
+
+
+def spin_z(angles, scale=1.0, location=(0.0, 0.0, 0.0)):
+    # (frames, 1, 4, 4) poses of one bone turning about Z
+    poses = np.tile(np.eye(4), (len(angles), 1, 1, 1))
+    cos, sin = np.cos(angles), np.sin(angles)
+    poses[:, 0, 0, 0], poses[:, 0, 0, 1] = cos * scale, -sin * scale
+    poses[:, 0, 1, 0], poses[:, 0, 1, 1] = sin * scale, cos * scale
+    poses[:, 0, 2, 2] = scale
+    poses[:, 0, :3, 3] = location
+    return poses
+
+def assert_interpolates(times, poses, keep):
+    # Every dropped frame must be rebuilt within tolerance from its surrounding keys
+    location, rotation, scale = decompose_matrices(poses)
+    rotation = make_continuous(rotation)
+    for bone in range(poses.shape[1]):
+        keys = np.flatnonzero(keep[:, bone])
+        for start, end in zip(keys[:-1], keys[1:]):
+            assert np.dot(rotation[start, bone], rotation[end, bone]) >= 0
+            for frame in range(start + 1, end):
+                alpha = (times[frame] - times[start]) / (times[end] - times[start])
+                blend = lambda values: values[start, bone] * (1 - alpha) + values[end, bone] * alpha
+                assert np.abs(blend(location) - location[frame, bone]).max() <= DEFAULT_LOCATION_TOLERANCE
+                assert np.abs(blend(scale) - scale[frame, bone]).max() <= DEFAULT_SCALE_TOLERANCE
+                if np.abs(scale[frame, bone]).min() > 0:
+                    blended = blend(rotation) / np.linalg.norm(blend(rotation))
+                    cosine = min(abs(np.dot(blended, rotation[frame, bone])), 1.0)
+                    assert 2 * np.arccos(cosine) <= DEFAULT_ROTATION_TOLERANCE
+
+
+def test_constant_keeps_the_ends():
+    times = np.arange(121) / 60
+    poses = np.tile(np.eye(4), (121, 3, 1, 1))
+    poses[:, 1, :3, 3] = (1.0, 2.0, 3.0)
+    keep = reduce_keys(times, poses)
+    assert keep.sum(axis=0).tolist() == [2, 2, 2]
+
+def test_linear_translation_keeps_the_ends():
+    times = np.arange(60) / 60
+    poses = np.tile(np.eye(4), (60, 1, 1, 1))
+    poses[:, 0, 0, 3] = np.linspace(0.0, 5.0, 60)
+    keep = reduce_keys(times, poses)
+    assert np.flatnonzero(keep[:, 0]).tolist() == [0, 59]
+
+def test_zero_scale_bone_keeps_the_ends():
+    times = np.arange(121) / 60
+    poses = np.concatenate([spin_z(np.zeros(121), scale=0.0), spin_z(np.linspace(0, 1, 121), scale=0.0)], axis=1)
+    keep = reduce_keys(times, poses)
+    assert keep.sum(axis=0).tolist() == [2, 2]
+
+def test_degenerate_basis_gives_unit_quaternions():
+    poses = spin_z(np.zeros(2), scale=0.0)
+    poses[1, 0, 0, 0] = 1.0
+    _, rotation, _ = decompose_matrices(poses)
+    assert np.allclose(np.linalg.norm(rotation, axis=-1), 1.0)
+
+@pytest.mark.parametrize("frame_count", [3, 9, 31])
+def test_half_turn(frame_count):
+    times = np.arange(frame_count) / 60
+    poses = spin_z(np.linspace(0, np.pi, frame_count))
+    keep = reduce_keys(times, poses)
+    assert keep[0, 0] and keep[-1, 0]
+    assert_interpolates(times, poses, keep)
+
+def test_half_turn_flip_between_two_frames():
+    times = np.arange(2) / 60
+    poses = spin_z(np.array([0.0, np.pi]))
+    assert reduce_keys(times, poses).all()
+
+@pytest.mark.parametrize("frame_count", [5, 9, 17])
+@pytest.mark.parametrize("exact", [False, True])
+def test_full_spins_split_instead_of_failing(frame_count, exact):
+    # Quarter turns per step, exact matrices blend opposite quaternions to exactly zero
+    times = np.arange(frame_count) / 60
+    poses = spin_z(np.arange(frame_count) * np.pi / 2)
+    if exact:
+        poses = np.round(poses)
+    keep = reduce_keys(times, poses)
+    assert keep.sum() >= frame_count // 2 + 1
+    assert_interpolates(times, poses, keep)
+
+def test_mixed_bones_stay_within_tolerance():
+    rng = np.random.default_rng(7)
+    times = np.arange(90) / 30
+    angles = np.cumsum(rng.uniform(0, 0.2, 90))
+    poses = np.concatenate([
+        spin_z(angles, location=np.stack([np.sin(times), times, np.zeros(90)], axis=1)),
+        spin_z(np.zeros(90), scale=0.0),
+        spin_z(np.linspace(0, 4 * np.pi, 90)),
+    ], axis=1)
+    keep = reduce_keys(times, poses)
+    assert_interpolates(times, poses, keep)
+    assert keep.sum() < keep.size
@@ -0,0 +1,96 @@
+import random
+import struct
+import pytest
+from hades2_blender_utility import lz4_handler
+
+requires_native = pytest.mark.skipif(lz4_handler.lz4_block is None, reason="needs the 'lz4' module")
+
+
+def sample_inputs():
+    rng = random.Random(1234)
+    words = [b"Armature", b"Bone", b"Spine", b"Mesh", b"_L", b"_R", b"\x00", b"\x00\x00\x80\x3f"]
+    inputs = [b"", b"a", bytes(12), bytes(13), b"ab" * 40, bytes(70000)]
+    for size in (64, 1000, 65536, 200000):
+        inputs.append(rng.randbytes(size))
+        inputs.append(b"".join(rng.choice(words) for _ in range(size // 4))[:size])
+    return inputs
+
+INPUTS = sample_inputs()
+
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    backend = lz4_handler.get_backend()
+    yield
+    lz4_handler.set_backend(backend)
+
+def compress(backend, data, level):
+    lz4_handler.set_backend(backend)
+    return bytes(lz4_handler.compress_lz4_data(data, level))
+
+def decompress(backend, block, size_hint=None):
+    lz4_handler.set_backend(backend)
+    return bytes(lz4_handler.decompress_lz4_data(block, size_hint))
+
+
+@requires_native
+@pytest.mark.parametrize("level", list(lz4_handler.COMPRESSION_LEVELS))
+@pytest.mark.parametrize("encoder, decoder", [('python', 'native'), ('native', 'python')])
+@pytest.mark.parametrize("index", range(len(INPUTS)))
+def test_backends_decode_each_other(encoder, decoder, level, index):
+    data = INPUTS[index]
+    block = compress(encoder, data, level)
+    assert decompress(decoder, block) == data
+    assert decompress(decoder, block, len(data)) == data
+
+@requires_native
+@pytest.mark.parametrize("index", range(len(INPUTS)))
+def test_backends_decode_to_the_same_bytes(index):
+    data = INPUTS[index]
+    for level in lz4_handler.COMPRESSION_LEVELS:
+        for encoder in ('python', 'native'):
+            block = compress(encoder, data, level)
+            assert decompress('python', block) == decompress('native', block)
+
+@pytest.mark.parametrize("level", list(lz4_handler.COMPRESSION_LEVELS))
+@pytest.mark.parametrize("index", range(len(INPUTS)))
+def test_python_round_trip(level, index):
+    data = INPUTS[index]
+    assert decompress('python', compress('python', data, level)) == data
+
+def test_unknown_backend_and_level():
+    with pytest.raises(ValueError):
+        lz4_handler.set_backend('zstd')
+    with pytest.raises(ValueError):
+        lz4_handler.compress_lz4_data(b"data", 'max')
+
+@pytest.mark.parametrize("backend", ['python', pytest.param('native', marks=requires_native)])
+@pytest.mark.parametrize("block", [b"\x00\x05\x00", b"\xf0", b"\x1fA\x01"])
+def test_corrupt_file_raises_the_decode_error(tmp_path, backend, block):
+    # The mapped file must still close, a BufferError would hide the real error
+    path = tmp_path / "corrupt.gr2.lz4"
+    path.write_bytes(block)
+    lz4_handler.set_backend(backend)
+    with pytest.raises(Exception) as excinfo:
+        lz4_handler.decompress_lz4_file(str(path))
+    assert not isinstance(excinfo.value, BufferError)
+    if backend == 'python':
+        assert isinstance(excinfo.value, ValueError)
+
+@pytest.mark.parametrize("backend", ['python', pytest.param('native', marks=requires_native)])
+def test_gr2_header_gives_the_size_hint(tmp_path, backend):
+    rng = random.Random(5)
+    body = b"".join(struct.pack('<f', rng.choice([0.0, 1.0, 0.5])) for _ in range(20000))
+    total_size = 32 + 8 + len(body)
+    data = bytes(range(16)) + struct.pack('<4I', 0x1b8, 0, 0, 0) + struct.pack('<2I', 7, total_size) + body
+    lz4_handler.set_backend(backend)
+    block = bytes(lz4_handler.compress_lz4_data(data, 'high'))
+    assert lz4_handler.gr2_size_hint(block) == total_size
+
+    path = tmp_path / "model.gr2.lz4"
+    path.write_bytes(block)
+    assert bytes(lz4_handler.decompress_lz4_file(str(path))) == data
+
+def test_no_size_hint_for_other_data():
+    assert lz4_handler.gr2_size_hint(bytes(lz4_handler.python_compress(b"short"))) is None
+    assert lz4_handler.gr2_size_hint(bytes(lz4_handler.python_compress(b"\xff" * 100))) is None
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+from hades2_blender_utility.collada_reader import ColladaModel
+from hades2_blender_utility.model_cache import ModelCache
+
+
+def small_model():
+    model = ColladaModel()
+    model.has_visual_scene = True
+    model.joints.append(("root", -1, np.eye(4).ravel().tolist()))
+    model.joints.append(("child", 0, None))
+    return model
+
+
+def test_round_trip(tmp_path):
+    cache = ModelCache(str(tmp_path))
+    cache.store("key", small_model())
+    model = cache.load("key")
+    assert model.has_visual_scene
+    assert model.joints == small_model().joints
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_truncated_entry_is_a_miss_and_removed(tmp_path):
+    cache = ModelCache(str(tmp_path))
+    cache.store("key", small_model())
+    path = cache.path("key")
+    with open(path, 'r+b') as file:
+        file.truncate(os.path.getsize(path) // 2)
+
+    assert cache.load("key") is None
+    assert not os.path.exists(path)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # The next store replaces it and loads again
+    cache.store("key", small_model())
+    assert cache.load("key") is not None
+
+def test_garbage_entry_is_a_miss(tmp_path):
+    cache = ModelCache(str(tmp_path))
+    os.makedirs(cache.cache_dir, exist_ok=True)
+    with open(cache.path("key"), 'wb') as file:
+        file.write(b"not an npz file")
+    assert cache.load("key") is None
+    assert not os.path.exists(cache.path("key"))